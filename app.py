@@ -1,18 +1,23 @@
 import os
-import json
 import re
-import requests
 import datetime
-from dateutil import parser
 import streamlit as st
-import pandas as pd
 from dotenv import load_dotenv
-from azure.ai.projects import AIProjectClient
-from azure.identity import DefaultAzureCredential
 
-# ---- ENVIRONMENT AND CLIENTS ----
+# Load .env before the helper modules below read their settings at import time
 load_dotenv()
 
+import throttle
+from tracing import span, record_usage, latency_rows
+from chat_context import ChatContext, rollover_thread
+from extraction import extract_candidate_table
+from faq_cache import FAQCache, agent_fingerprint
+from session_store import SessionStore
+from state_backend import get_backend
+from prewarm import Prewarmer, TokenCache, scheduling_signal, GRAPH_WARM_URL
+from bulk_scheduling import index_record, select_events, bulk_cancel, bulk_reschedule, apply_results
+
+# ---- ENVIRONMENT AND CLIENTS ----
 AZURE_CONN_STR           = os.getenv("AZURE_CONN_STR")
 AGENT_ID                 = os.getenv("AGENT_ID")
 THREAD_ID                = os.getenv("THREAD_ID")
@@ -20,30 +25,48 @@ TENANT_ID                = os.getenv("TENANT_ID")
 CLIENT_ID                = os.getenv("CLIENT_ID")
 CLIENT_SECRET            = os.getenv("CLIENT_SECRET")
 USER_EMAIL               = os.getenv("USER_EMAIL")
-GROQ_API_KEY             = os.getenv("GROQ_API_KEY")
 GROQ_API_URL             = os.getenv("GROQ_API_URL")
-MODEL_NAME               = os.getenv("MODEL_NAME")
 CANDIDATE_EMAIL_OVERRIDE = os.getenv("CANDIDATE_EMAIL_OVERRIDE")
 
-project_client = AIProjectClient.from_connection_string(
-    credential=DefaultAzureCredential(),
-    conn_str=AZURE_CONN_STR
-)
+# Heavy SDKs are imported on first use so the page shell renders before they load
+@st.cache_resource(show_spinner=False)
+def get_project_client():
+    from azure.ai.projects import AIProjectClient
+    from azure.identity import DefaultAzureCredential
+    return AIProjectClient.from_connection_string(
+        credential=DefaultAzureCredential(),
+        conn_str=AZURE_CONN_STR
+    )
+
+# Re-read periodically so agent config changes reach the FAQ cache fingerprint
+@st.cache_resource(show_spinner=False, ttl=300)
+def get_agent():
+    return get_project_client().agents.get_agent(AGENT_ID)
+
+def get_thread():
+    # The thread id is shared session state so a rollover on one instance is seen by all of them
+    thread_id = session.flags.get("thread_id") or THREAD_ID
+    thread = st.session_state.get("thread")
+    if thread is None or thread.id != thread_id:
+        thread = st.session_state.thread = get_project_client().agents.get_thread(thread_id)
+    return thread
 
-if "scheduled_events" not in st.session_state:
-    st.session_state.scheduled_events = {}
+# History, candidate table and scheduled events live in a memory-bounded store, not st.session_state
+@st.cache_resource(show_spinner=False)
+def get_session_store():
+    return SessionStore()
+
+# The session id rides in the URL so any instance behind the load balancer can resume it
+if "sid" not in st.session_state:
+    st.session_state.sid = st.query_params.get("sid") or SessionStore.new_id()
+    st.query_params["sid"] = st.session_state.sid
+session = get_session_store().session(st.session_state.sid)
 
 def save_chat_history(history):
-    base = "all_chat_history_sr_"
-    os.makedirs(base, exist_ok=True)
-    files = [f for f in os.listdir(base) if f.endswith(".txt")]
-    nums = [int(re.findall(r'\d+', f)[-1]) for f in files if re.search(r'\d+', f)]
-    sr = max(nums, default=0) + 1
-    path = os.path.join(base, f"all_chat_history_sr_{sr}.txt")
-    with open(path, "w", encoding="utf-8") as f:
-        f.write(f"Serial Number: {sr}\n\n")
-        for e in history:
-            f.write(f"User: {e['user']}\nBot: {e['bot']}\n\n" + "-"*40 + "\n\n")
+    def render(sr):
+        return f"Serial Number: {sr}\n\n" + "".join(
+            f"User: {e['user']}\nBot: {e['bot']}\n\n" + "-"*40 + "\n\n" for e in history)
+    path = get_backend().save_archive(render)
     return path
 
 def extract_schedule_cancel_info(bot_msg):
@@ -61,8 +84,8 @@ def extract_schedule_cancel_info(bot_msg):
         job_profile = job_profile_match.group(1).strip() if job_profile_match else ""
         interviewer_name = interviewer_email.split('@')[0].replace('.', ' ').title()
         if not job_profile or job_profile.lower() == "interview":
-            job_profile = st.session_state.get("last_job_profile", "python developer")
-        st.session_state["last_job_profile"] = job_profile
+            job_profile = session.flags.get("last_job_profile", "python developer")
+        session.flags["last_job_profile"] = job_profile
         return {
             "action": "schedule",
             "candidate": {
@@ -77,9 +100,15 @@ def extract_schedule_cancel_info(bot_msg):
                 "job_profile": job_profile
             }
         }
-    cancel = re.search(
-        r'❌ Interview cancelled for ([\w\s]+) \(([\w\.-]+@[\w\.-]+)\s*&\s*([\w\.-]+@[\w\.-]+)\)', bot_msg)
-    if cancel:
+    cancels = list(re.finditer(
+        r'❌ Interview cancelled for ([\w\s]+) \(([\w\.-]+@[\w\.-]+)\s*&\s*([\w\.-]+@[\w\.-]+)\)', bot_msg))
+    if len(cancels) > 1:
+        return {
+            "action": "bulk_cancel",
+            "candidates": [{"name": m.group(1).strip(), "email": m.group(2).strip()} for m in cancels]
+        }
+    if cancels:
+        cancel = cancels[0]
         candidate_name = cancel.group(1).strip()
         candidate_email = cancel.group(2).strip()
         interviewer_email = cancel.group(3).strip()
@@ -97,7 +126,7 @@ def extract_schedule_cancel_info(bot_msg):
         }
     return None
 
-def get_access_token():
+def fetch_access_token():
     url = f'https://login.microsoftonline.com/{TENANT_ID}/oauth2/v2.0/token'
     data = {
         'grant_type':    'client_credentials',
@@ -105,22 +134,31 @@ def get_access_token():
         'client_secret': CLIENT_SECRET,
         'scope':         'https://graph.microsoft.com/.default'
     }
-    r = requests.post(url, data=data)
-    r.raise_for_status()
-    return r.json()['access_token']
+    with span("graph.token"):
+        r = throttle.post("aad", url, data=data)
+        r.raise_for_status()
+    return r.json()
+
+@st.cache_resource(show_spinner=False)
+def get_token_cache():
+    return TokenCache(fetch_access_token)
+
+def get_access_token():
+    return get_token_cache().get()
 
 def create_teams_meeting(token, interviewer, candidate):
     date = candidate.get('date')
     time_str = candidate.get('time')
     if not date or not time_str:
         raise ValueError(f"Missing date or time for candidate {candidate.get('name','Unknown')}")
+    from dateutil import parser
     dt = parser.parse(f"{date} {time_str}")
     start = dt.isoformat()
     end = (dt + datetime.timedelta(minutes=40)).isoformat()
     job_profile = candidate.get('job_profile')
     if not job_profile or job_profile.lower() == "interview":
-        job_profile = st.session_state.get("last_job_profile", "python developer")
-    st.session_state["last_job_profile"] = job_profile
+        job_profile = session.flags.get("last_job_profile", "python developer")
+    session.flags["last_job_profile"] = job_profile
 
     headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
     payload = {
@@ -143,43 +181,168 @@ def create_teams_meeting(token, interviewer, candidate):
         "onlineMeetingProvider": "teamsForBusiness"
     }
     url = f"https://graph.microsoft.com/v1.0/users/{USER_EMAIL}/events"
-    r = requests.post(url, headers=headers, json=payload)
-    if not r.ok:
-        r.raise_for_status()
+    with span("graph.create_event", attendees=2):
+        r = throttle.post("graph", url, headers=headers, json=payload)
+        if not r.ok:
+            r.raise_for_status()
     resp_json = r.json()
-    st.session_state.scheduled_events[candidate['email']] = resp_json['id']
+    session.scheduled_events[resp_json['id']] = index_record(
+        dict(candidate, job_profile=job_profile), interviewer)
     # return resp_json['onlineMeeting']['joinUrl']    # <- Don't return joinUrl!
     return "success"
 
-def cancel_teams_meeting(token, candidate_email):
-    event_id = st.session_state.scheduled_events.get(candidate_email)
-    if not event_id:
-        raise ValueError(f"No scheduled meeting found for {candidate_email}")
+def cancel_teams_meeting(token, candidate_email, candidate_name=None):
+    # Match the name too: with CANDIDATE_EMAIL_OVERRIDE the index holds the override address
+    candidates = [candidate_email] + ([candidate_name] if candidate_name else [])
+    event_ids = select_events(session.scheduled_events, candidates=candidates)
+    if not event_ids:
+        raise ValueError(f"No scheduled meeting found for {candidate_name or candidate_email}")
+    event_id = event_ids[-1]
     url = f"https://graph.microsoft.com/v1.0/users/{USER_EMAIL}/events/{event_id}"
     headers = {"Authorization": f"Bearer {token}"}
-    r = requests.delete(url, headers=headers)
+    with span("graph.delete_event"):
+        r = throttle.delete("graph", url, headers=headers)
     if r.status_code in [204, 200]:
-        del st.session_state.scheduled_events[candidate_email]
+        del session.scheduled_events[event_id]
         return True
     else:
         r.raise_for_status()
     return False
 
-def get_bot_reply(user_input, thread, agent):
-    project_client.agents.create_message(
-        thread_id=thread.id,
-        role="user",
-        content=user_input
-    )
-    project_client.agents.create_and_process_run(
-        thread_id=thread.id,
-        assistant_id=agent.id
-    )
-    msgs = project_client.agents.list_messages(thread_id=thread.id)
+def get_bot_reply(user_input, thread, agent, context=None):
+    project_client = get_project_client()
+    with span("agent.create_message"):
+        throttle.acquire("agents")
+        project_client.agents.create_message(
+            thread_id=thread.id,
+            role="user",
+            content=user_input
+        )
+    with span("agent.run") as run_span:
+        throttle.acquire("agents")
+        run = project_client.agents.create_and_process_run(
+            thread_id=thread.id,
+            assistant_id=agent.id
+        )
+        record_usage(getattr(run, "usage", None), run_span)
+    with span("agent.list_messages"):
+        throttle.acquire("agents")
+        msgs = project_client.agents.list_messages(thread_id=thread.id)
     bot_msg = next(iter(msgs.text_messages), None)
     reply = bot_msg.text['value'] if bot_msg else "Sorry, I didn't understand that."
+    if context is not None:
+        usage = getattr(run, "usage", None)
+        context.add_turn(user_input, reply, getattr(usage, "prompt_tokens", None))
+    return reply
+
+def run_bulk_action(token, action, event_ids, **slot):
+    index = session.scheduled_events
+    if action == "cancel":
+        results = bulk_cancel(token, USER_EMAIL, index, event_ids)
+    else:
+        results = bulk_reschedule(token, USER_EMAIL, index, event_ids, **slot)
+    ok, failed = apply_results(index, action, results)
+    verb = "cancelled" if action == "cancel" else "rescheduled"
+    note = f"Bulk {action}: {ok}/{len(results)} meetings {verb}."
+    for res in results:
+        if not res["ok"]:
+            note += f" Failed for {res['name'] or res['event_id']} ({res['email']}): {res['error']}."
+    return note
+
+def render_bulk_panel():
+    index = session.scheduled_events
+    with st.sidebar.expander("📅 Bulk cancel / reschedule", expanded=False):
+        if not index:
+            st.caption("No meetings scheduled in this session.")
+            return
+        with st.form("bulk_actions"):
+            names = sorted({rec["name"] for rec in index.values()})
+            interviewers = sorted({rec["interviewer_email"] for rec in index.values()})
+            picked = st.multiselect("Candidates (empty = all)", names)
+            interviewer = st.selectbox("Interviewer", ["Any"] + interviewers)
+            on_date = st.text_input("On date (YYYY-MM-DD, optional)")
+            action = st.radio("Action", ["Cancel", "Reschedule"], horizontal=True)
+            new_date = st.text_input("New date (reschedule)")
+            new_time = st.text_input("New time, e.g. 03:30 PM (reschedule)")
+            shift = st.number_input("…or shift by minutes", value=0, step=15)
+            submitted = st.form_submit_button("Apply")
+        if submitted:
+            event_ids = select_events(index, candidates=picked or None,
+                                      interviewer=None if interviewer == "Any" else interviewer,
+                                      date=on_date or None)
+            if not event_ids:
+                st.warning("No meetings match these filters.")
+                return
+            with span("bulk.panel", action=action.lower()) as root:
+                try:
+                    token = get_access_token()
+                    if action == "Cancel":
+                        note = run_bulk_action(token, "cancel", event_ids)
+                    else:
+                        note = run_bulk_action(token, "reschedule", event_ids, new_date=new_date or None,
+                                               new_time=new_time or None, shift_minutes=int(shift) or None)
+                    session.append_turn({"user": "", "bot": note})
+                    st.session_state.context.add_turn("", note)
+                    st.success(note)
+                except Exception as e:
+                    st.error(f"Bulk {action.lower()} failed: {e}")
+                # As in the chat path: keep any speculative extraction in step with the new transcript
+                st.session_state.prewarmer.refresh(st.session_state.context.transcript())
+            st.session_state.last_trace_id = root.trace_id
+
+@st.cache_resource(show_spinner=False)
+def get_faq_cache():
+    return FAQCache(backend=get_backend())
+
+def record_cached_turn(thread, user_input, reply):
+    """Post a cache-served exchange to the agent thread so the agent still sees the whole conversation."""
+    project_client = get_project_client()
+    with span("agent.record_cached_turn"):
+        for role, content in (("user", user_input), ("assistant", reply)):
+            throttle.acquire("agents")
+            project_client.agents.create_message(thread_id=thread.id, role=role, content=content)
+
+def get_cached_reply(user_input, thread, agent, context):
+    """Serve repeated generic HR questions locally; anything candidate-specific goes to the agent."""
+    cache = get_faq_cache()
+    cache.invalidate(agent_fingerprint(agent))
+    previous_reply = context.turns[-1]["bot"] if context.turns else None
+    reply, hit = cache.answer(user_input, lambda: get_bot_reply(user_input, thread, agent, context), previous_reply)
+    if hit:
+        record_cached_turn(thread, user_input, reply)
+        context.add_turn(user_input, reply)
     return reply
 
+def render_memory_panel():
+    metrics = get_session_store().metrics()
+    mine = next((r for r in metrics["sessions"] if r["session"] == st.session_state.sid[:8]), None)
+    with st.sidebar.expander("🧠 Session memory", expanded=False):
+        if mine:
+            st.caption(
+                f"This session: {mine['bytes'] / 1024:.1f} KiB in memory, {mine['hot_turns']} recent turns, "
+                f"{mine['spilled_turns']} older turns in the state store."
+            )
+        st.caption(
+            f"Server: {metrics['live']} live sessions, {metrics['total_bytes'] / 1024 / 1024:.1f} of "
+            f"{metrics['global_max_bytes'] / 1024 / 1024:.0f} MiB, {metrics['evicted']} evicted, "
+            f"{metrics['commit_conflicts']} concurrent-write retries."
+        )
+
+def render_latency_panel():
+    rows = latency_rows(st.session_state.get("last_trace_id"))
+    with st.sidebar.expander("⏱️ Latency (last action)", expanded=False):
+        if rows:
+            st.table(rows)
+        else:
+            st.caption("No timings recorded yet.")
+        faq = get_faq_cache().report()
+        st.caption(
+            f"FAQ cache: {faq['hits']} hits / {faq['hits'] + faq['misses']} cacheable questions "
+            f"({faq['hit_rate']:.0%}), ~{faq['saved_seconds']}s of agent time saved, {faq['entries']} entries."
+        )
+        if st.button("Clear FAQ cache"):
+            get_faq_cache().invalidate()
+
 st.set_page_config(page_title="INTELLIBOT", layout="wide")
 st.markdown(
     """
@@ -257,17 +420,16 @@ st.markdown(
 st.markdown('<div class="app-header">INTELLIBOT</div>', unsafe_allow_html=True)
 st.write("I am Intellibot. How can I help you today for interview scheduling?")
 
-if "history" not in st.session_state:
-    st.session_state.history = []
-if "candidate_table" not in st.session_state:
-    st.session_state.candidate_table = pd.DataFrame()
-if "chat_mode" not in st.session_state:
-    st.session_state.chat_mode = True
+if "context" not in st.session_state:
+    # Rebuilt from the stored history when this instance picks up a session another one started
+    st.session_state.context = ChatContext()
+    for turn in session.iter_history():
+        st.session_state.context.add_turn(turn["user"], turn["bot"])
+if "prewarmer" not in st.session_state:
+    st.session_state.prewarmer = Prewarmer(get_token_cache(), extract=extract_candidate_table,
+                                           warm_urls=[GRAPH_WARM_URL, GROQ_API_URL])
 
-agent  = project_client.agents.get_agent(AGENT_ID)
-thread = project_client.agents.get_thread(THREAD_ID)
-
-for msg in st.session_state.history:
+for msg in session.iter_history():
     st.markdown(
         f'<div class="chat-row"><div class="user-msg">{msg["user"]}</div></div>',
         unsafe_allow_html=True
@@ -277,95 +439,121 @@ for msg in st.session_state.history:
         unsafe_allow_html=True
     )
 
-if st.session_state.chat_mode:
+if session.flags.get("chat_mode", True):
     user_input = st.chat_input("Type your message and hit Enter…")
     if user_input:
         if user_input.strip().lower() == "exit":
-            st.session_state.chat_mode = False
+            session.flags["chat_mode"] = False
         else:
-            st.markdown(
-                f'<div class="chat-row"><div class="user-msg">{user_input}</div></div>',
-                unsafe_allow_html=True
-            )
-            bot_reply = get_bot_reply(user_input, thread, agent)
-            st.markdown(
-                f'<div class="chat-row"><div class="bot-msg">{bot_reply}</div></div>',
-                unsafe_allow_html=True
-            )
-            st.session_state.history.append({"user": user_input, "bot": bot_reply})
+            with span("chat.turn", entry="app") as turn:
+                st.markdown(
+                    f'<div class="chat-row"><div class="user-msg">{user_input}</div></div>',
+                    unsafe_allow_html=True
+                )
+                bot_reply = get_cached_reply(user_input, get_thread(), get_agent(), st.session_state.context)
+                if st.session_state.context.needs_rollover:
+                    with span("agent.rollover"):
+                        st.session_state.thread = rollover_thread(get_project_client(), st.session_state.context)
+                        session.flags["thread_id"] = st.session_state.thread.id
+                st.markdown(
+                    f'<div class="chat-row"><div class="bot-msg">{bot_reply}</div></div>',
+                    unsafe_allow_html=True
+                )
+                session.append_turn({"user": user_input, "bot": bot_reply})
 
-            sched_cancel_info = extract_schedule_cancel_info(bot_reply)
-            if sched_cancel_info:
-                try:
-                    token = get_access_token()
-                    if sched_cancel_info["action"] == "schedule":
-                        c = sched_cancel_info["candidate"]
-                        if CANDIDATE_EMAIL_OVERRIDE:
-                            c['email'] = CANDIDATE_EMAIL_OVERRIDE
-                        create_status = create_teams_meeting(token, c["interviewer"], c)
-                        st.markdown(
-                            f'<div class="chat-row"><div class="bot-msg">✅ Meeting scheduled successfully for {c["name"]} with {c["interviewer"]["name"]}.</div></div>',
-                            unsafe_allow_html=True
-                        )
-                        st.session_state.history.append({"user": "", "bot": 'Meeting scheduled successfully.'})
-                    elif sched_cancel_info["action"] == "cancel":
-                        c = sched_cancel_info["candidate"]
-                        cancelled = cancel_teams_meeting(token, c["email"])
-                        if cancelled:
+                sched_cancel_info = extract_schedule_cancel_info(bot_reply)
+                if not sched_cancel_info:
+                    # Booking looks imminent: fetch the token and open Graph/Groq connections now
+                    transcript = st.session_state.context.transcript()
+                    st.session_state.prewarmer.trigger(scheduling_signal(bot_reply, transcript), transcript)
+                if sched_cancel_info:
+                    try:
+                        token = get_access_token()
+                        if sched_cancel_info["action"] == "schedule":
+                            c = sched_cancel_info["candidate"]
+                            if CANDIDATE_EMAIL_OVERRIDE:
+                                c['email'] = CANDIDATE_EMAIL_OVERRIDE
+                            create_status = create_teams_meeting(token, c["interviewer"], c)
                             st.markdown(
-                                f'<div class="chat-row"><div class="bot-msg">❌ Meeting cancelled for {c["name"]} ({c["email"]}).</div></div>',
+                                f'<div class="chat-row"><div class="bot-msg">✅ Meeting scheduled successfully for {c["name"]} with {c["interviewer"]["name"]}.</div></div>',
                                 unsafe_allow_html=True
                             )
-                            st.session_state.history.append({"user": "", "bot": f'Meeting cancelled for {c["name"]} ({c["email"]})'})
-                except Exception as e:
-                    st.markdown(
-                        f'<div class="chat-row"><div class="bot-msg">❌ Scheduling/Cancellation error: {e}</div></div>',
-                        unsafe_allow_html=True
-                    )
+                            session.append_turn({"user": "", "bot": 'Meeting scheduled successfully.'})
+                            st.session_state.context.add_turn("", 'Meeting scheduled successfully.')
+                        elif sched_cancel_info["action"] == "cancel":
+                            c = sched_cancel_info["candidate"]
+                            cancelled = cancel_teams_meeting(token, c["email"], c["name"])
+                            if cancelled:
+                                st.markdown(
+                                    f'<div class="chat-row"><div class="bot-msg">❌ Meeting cancelled for {c["name"]} ({c["email"]}).</div></div>',
+                                    unsafe_allow_html=True
+                                )
+                                session.append_turn({"user": "", "bot": f'Meeting cancelled for {c["name"]} ({c["email"]})'})
+                                st.session_state.context.add_turn("", f'Meeting cancelled for {c["name"]} ({c["email"]})')
+                        elif sched_cancel_info["action"] == "bulk_cancel":
+                            wanted = [v for c in sched_cancel_info["candidates"] for v in (c["name"], c["email"])]
+                            event_ids = select_events(session.scheduled_events, candidates=wanted)
+                            if not event_ids:
+                                raise ValueError("No scheduled meetings found for "
+                                                 + ", ".join(c["name"] for c in sched_cancel_info["candidates"]))
+                            note = run_bulk_action(token, "cancel", event_ids)
+                            st.markdown(f'<div class="chat-row"><div class="bot-msg">❌ {note}</div></div>', unsafe_allow_html=True)
+                            session.append_turn({"user": "", "bot": note})
+                            st.session_state.context.add_turn("", note)
+                    except Exception as e:
+                        st.markdown(
+                            f'<div class="chat-row"><div class="bot-msg">❌ Scheduling/Cancellation error: {e}</div></div>',
+                            unsafe_allow_html=True
+                        )
+                    # The confirmations above changed the transcript; keep any speculative extraction in step
+                    st.session_state.prewarmer.refresh(st.session_state.context.transcript())
+            st.session_state.last_trace_id = turn.trace_id
 
-if st.session_state.candidate_table is not None and not st.session_state.candidate_table.empty:
+if session.table is not None and not session.table.empty:
     st.write("### All Candidate Details (including all key skills)")
-    st.dataframe(st.session_state.candidate_table, use_container_width=True)
+    st.dataframe(session.table, use_container_width=True)
 
-if not st.session_state.chat_mode:
+if not session.flags.get("chat_mode", True):
     st.markdown(
-        '<div class="chat-row"><div class="bot-msg"><b>Session complete. Reload the app to start new chat.</b></div></div>',
+        '<div class="chat-row"><div class="bot-msg"><b>Session complete.</b></div></div>',
         unsafe_allow_html=True
     )
-    chat_content = "\n".join([f"User: {e['user']}\nBot: {e['bot']}" for e in st.session_state.history])
+    # Reloading keeps ?sid= and resumes this session, so starting over needs a fresh id
+    if st.button("Start new chat"):
+        st.query_params.clear()
+        st.session_state.clear()
+        st.rerun()
+    chat_content = st.session_state.context.transcript()
     try:
-        system = (
-            "Extract all candidates and all their available key skills from the chat. "
-            "For each candidate, show every skill present (do not skip any key skill). "
-            "Return a list of candidate objects as JSON, with these columns: "
-            "[Name, Email, Key Skill (comma-separated), Total Experience, Relevant Experience, Location, Notice Period, Interviewer Name, Interviewer Email, Date, Time, Job Profile]."
-        )
-        user = f"""Chat log:\n{chat_content}\nReturn the list as JSON array."""
-        payload = {
-            "model": MODEL_NAME,
-            "messages": [
-                {"role": "system", "content": system},
-                {"role": "user", "content": user}
-            ],
-            "temperature": 0.1
-        }
-        headers = {"Authorization": f"Bearer {GROQ_API_KEY}", "Content-Type": "application/json"}
-        resp = requests.post(GROQ_API_URL, json=payload, headers=headers)
-        resp.raise_for_status()
-        content = resp.json()['choices'][0]['message']['content']
-        m = re.search(r'\[.*\]', content, re.DOTALL)
-        if m:
-            data = json.loads(m.group(0))
+        import pandas as pd
+        data = st.session_state.prewarmer.extraction_for(chat_content)
+        if data is None:
+            with span("session.extract", entry="app") as root:
+                st.session_state.last_trace_id = root.trace_id
+                data = extract_candidate_table(chat_content)
+        st.session_state.prewarmer.discard()
+        if data is not None:
             df = pd.DataFrame(data)
             if 'Key Skill' in df.columns:
                 df['Key Skill'] = df['Key Skill'].apply(lambda x: ', '.join(x) if isinstance(x, list) else x)
-            st.session_state.candidate_table = df
+            session.table = df
             st.write("### All Candidate Details (including all key skills)")
             st.dataframe(df, use_container_width=True)
             if "Job Profile" in df.columns and not df["Job Profile"].isnull().all():
                 job_profile = df["Job Profile"].dropna().astype(str).iloc[0]
-                st.session_state["last_job_profile"] = job_profile
+                session.flags["last_job_profile"] = job_profile
         else:
             st.warning("Candidate data could not be extracted. Try again.")
     except Exception as ex:
         st.error(f"Could not extract candidate table: {ex}")
+
+render_bulk_panel()
+render_latency_panel()
+get_session_store().commit(session)
+render_memory_panel()
+get_session_store().enforce()
+
+# Warm the agent connection once the page is already on screen
+if session.flags.get("chat_mode", True):
+    get_agent()
+    get_thread()
@@ -1,18 +1,20 @@
 import os
-import json
-import re
-import ast
-import requests
 import datetime
-from dateutil import parser
 import streamlit as st
 from dotenv import load_dotenv
-from azure.ai.projects import AIProjectClient
-from azure.identity import DefaultAzureCredential
 
-# Load environment variables from .env file
+# Load .env before the helper modules below read their settings at import time
 load_dotenv()
 
+import throttle
+from tracing import span, record_usage, latency_rows
+from chat_context import ChatContext, rollover_thread
+from extraction import extract_meeting_info
+from faq_cache import FAQCache, agent_fingerprint
+from session_store import SessionStore
+from state_backend import get_backend
+from prewarm import Prewarmer, TokenCache, scheduling_signal, GRAPH_WARM_URL
+
 AZURE_CONN_STR           = os.getenv("AZURE_CONN_STR")
 AGENT_ID                 = os.getenv("AGENT_ID")
 THREAD_ID                = os.getenv("THREAD_ID")
@@ -25,85 +27,48 @@ GROQ_API_URL             = os.getenv("GROQ_API_URL")
 MODEL_NAME               = os.getenv("MODEL_NAME")
 CANDIDATE_EMAIL_OVERRIDE = os.getenv("CANDIDATE_EMAIL_OVERRIDE")
 
-project_client = AIProjectClient.from_connection_string(
-    credential=DefaultAzureCredential(),
-    conn_str=AZURE_CONN_STR
-)
+# Heavy SDKs are imported on first use so the page shell renders before they load
+@st.cache_resource(show_spinner=False)
+def get_project_client():
+    from azure.ai.projects import AIProjectClient
+    from azure.identity import DefaultAzureCredential
+    return AIProjectClient.from_connection_string(
+        credential=DefaultAzureCredential(),
+        conn_str=AZURE_CONN_STR
+    )
 
-def save_chat_history(history):
-    base = "all_chat_history_sr_"
-    os.makedirs(base, exist_ok=True)
-    files = [f for f in os.listdir(base) if f.endswith(".txt")]
-    nums = [int(re.findall(r'\d+', f)[-1]) for f in files if re.search(r'\d+', f)]
-    sr = max(nums, default=0) + 1
-    path = os.path.join(base, f"all_chat_history_sr_{sr}.txt")
-    with open(path, "w", encoding="utf-8") as f:
-        f.write(f"Serial Number: {sr}\n\n")
-        for e in history:
-            f.write(f"User: {e['user']}\nBot: {e['bot']}\n\n" + "-"*40 + "\n\n")
-    return path
+# Re-read periodically so agent config changes reach the FAQ cache fingerprint
+@st.cache_resource(show_spinner=False, ttl=300)
+def get_agent():
+    return get_project_client().agents.get_agent(AGENT_ID)
 
-def extract_meeting_info(chat_content):
-    system = (
-        "Extract all candidates with their respective interviewer details (name, email), date, time from the chat. "
-        "Return ONLY a single valid JSON object. Output ONLY valid minified JSON. Use double quotes. "
-        "Do not include explanations, comments, or markdown."
-    )
-    user = f"""Chat log:
-{chat_content}
+def get_thread():
+    # The thread id is shared session state so a rollover on one instance is seen by all of them
+    thread_id = session.flags.get("thread_id") or THREAD_ID
+    thread = st.session_state.get("thread")
+    if thread is None or thread.id != thread_id:
+        thread = st.session_state.thread = get_project_client().agents.get_thread(thread_id)
+    return thread
 
-Return JSON in this shape:
-{{
-  "candidates": [
-    {{
-      "name": "Candidate Name",
-      "email": "email@example.com",
-      "interviewer": {{
-        "name": "Interviewer Name",
-        "email": "interviewer@example.com"
-      }},
-      "date": "YYYY-MM-DD",
-      "time": "HH:MM AM/PM",
-      "product": "Interview"
-    }}
-  ]
-}}"""
-    payload = {
-        "model": MODEL_NAME,
-        "messages": [
-            {"role": "system", "content": system},
-            {"role": "user",   "content": user}
-        ],
-        "temperature": 0.2
-    }
-    headers = {"Authorization": f"Bearer {GROQ_API_KEY}", "Content-Type": "application/json"}
-    resp = requests.post(GROQ_API_URL, json=payload, headers=headers)
-    resp.raise_for_status()
-    text = resp.json()['choices'][0]['message']['content']
+# Chat history lives in a memory-bounded store, not st.session_state
+@st.cache_resource(show_spinner=False)
+def get_session_store():
+    return SessionStore()
 
-    # Try to extract first { ... } block from LLM response
-    m = re.search(r'\{[\s\S]*\}', text)
-    if not m:
-        raise ValueError("Could not parse JSON from LLM response. Raw text:\n" + text)
-    json_like = m.group(0)
+# The session id rides in the URL so any instance behind the load balancer can resume it
+if "sid" not in st.session_state:
+    st.session_state.sid = st.query_params.get("sid") or SessionStore.new_id()
+    st.query_params["sid"] = st.session_state.sid
+session = get_session_store().session(st.session_state.sid)
 
-    # Try loading as JSON, fallback to Python dict literal
-    try:
-        return json.loads(json_like)
-    except Exception:
-        try:
-            safe = (
-                json_like
-                .replace("None", "null")
-                .replace("True", "true")
-                .replace("False", "false")
-            )
-            data = ast.literal_eval(safe)
-            return data
-        except Exception:
-            raise ValueError(f"Failed to parse JSON. Raw extracted string:\n{json_like}")
+def save_chat_history(history):
+    def render(sr):
+        return f"Serial Number: {sr}\n\n" + "".join(
+            f"User: {e['user']}\nBot: {e['bot']}\n\n" + "-"*40 + "\n\n" for e in history)
+    path = get_backend().save_archive(render)
+    return path
 
-def get_access_token():
+def fetch_access_token():
     url = f'https://login.microsoftonline.com/{TENANT_ID}/oauth2/v2.0/token'
     data = {
         'grant_type':    'client_credentials',
@@ -111,15 +76,24 @@ def get_access_token():
         'client_secret': CLIENT_SECRET,
         'scope':         'https://graph.microsoft.com/.default'
     }
-    r = requests.post(url, data=data)
-    r.raise_for_status()
-    return r.json()['access_token']
+    with span("graph.token"):
+        r = throttle.post("aad", url, data=data)
+        r.raise_for_status()
+    return r.json()
+
+@st.cache_resource(show_spinner=False)
+def get_token_cache():
+    return TokenCache(fetch_access_token)
+
+def get_access_token():
+    return get_token_cache().get()
 
 def create_teams_meeting(token, interviewer, candidate):
     date = candidate.get('date')
     time_str = candidate.get('time')
     if not date or not time_str:
         raise ValueError(f"Missing date or time for candidate {candidate.get('name','Unknown')}")
+    from dateutil import parser
     dt = parser.parse(f"{date} {time_str}")
     start = dt.isoformat()
     end = (dt + datetime.timedelta(minutes=40)).isoformat()
@@ -145,26 +119,91 @@ def create_teams_meeting(token, interviewer, candidate):
         "onlineMeetingProvider": "teamsForBusiness"
     }
     url = f"https://graph.microsoft.com/v1.0/users/{USER_EMAIL}/events"
-    r = requests.post(url, headers=headers, json=payload)
-    if not r.ok:
-        r.raise_for_status()
+    with span("graph.create_event", attendees=2):
+        r = throttle.post("graph", url, headers=headers, json=payload)
+        if not r.ok:
+            r.raise_for_status()
     return True
 
-def get_bot_reply(user_input, thread, agent):
-    project_client.agents.create_message(
-        thread_id=thread.id,
-        role="user",
-        content=user_input
-    )
-    project_client.agents.create_and_process_run(
-        thread_id=thread.id,
-        assistant_id=agent.id
-    )
-    msgs = project_client.agents.list_messages(thread_id=thread.id)
+def get_bot_reply(user_input, thread, agent, context=None):
+    project_client = get_project_client()
+    with span("agent.create_message"):
+        throttle.acquire("agents")
+        project_client.agents.create_message(
+            thread_id=thread.id,
+            role="user",
+            content=user_input
+        )
+    with span("agent.run") as run_span:
+        throttle.acquire("agents")
+        run = project_client.agents.create_and_process_run(
+            thread_id=thread.id,
+            assistant_id=agent.id
+        )
+        record_usage(getattr(run, "usage", None), run_span)
+    with span("agent.list_messages"):
+        throttle.acquire("agents")
+        msgs = project_client.agents.list_messages(thread_id=thread.id)
     bot_msg = next(iter(msgs.text_messages), None)
     reply = bot_msg.text['value'] if bot_msg else "Sorry, I didn't understand that."
+    if context is not None:
+        usage = getattr(run, "usage", None)
+        context.add_turn(user_input, reply, getattr(usage, "prompt_tokens", None))
     return reply
 
+@st.cache_resource(show_spinner=False)
+def get_faq_cache():
+    return FAQCache(backend=get_backend())
+
+def record_cached_turn(thread, user_input, reply):
+    """Post a cache-served exchange to the agent thread so the agent still sees the whole conversation."""
+    project_client = get_project_client()
+    with span("agent.record_cached_turn"):
+        for role, content in (("user", user_input), ("assistant", reply)):
+            throttle.acquire("agents")
+            project_client.agents.create_message(thread_id=thread.id, role=role, content=content)
+
+def get_cached_reply(user_input, thread, agent, context):
+    """Serve repeated generic HR questions locally; anything candidate-specific goes to the agent."""
+    cache = get_faq_cache()
+    cache.invalidate(agent_fingerprint(agent))
+    previous_reply = context.turns[-1]["bot"] if context.turns else None
+    reply, hit = cache.answer(user_input, lambda: get_bot_reply(user_input, thread, agent, context), previous_reply)
+    if hit:
+        record_cached_turn(thread, user_input, reply)
+        context.add_turn(user_input, reply)
+    return reply
+
+def render_memory_panel():
+    metrics = get_session_store().metrics()
+    mine = next((r for r in metrics["sessions"] if r["session"] == st.session_state.sid[:8]), None)
+    with st.sidebar.expander("🧠 Session memory", expanded=False):
+        if mine:
+            st.caption(
+                f"This session: {mine['bytes'] / 1024:.1f} KiB in memory, {mine['hot_turns']} recent turns, "
+                f"{mine['spilled_turns']} older turns in the state store."
+            )
+        st.caption(
+            f"Server: {metrics['live']} live sessions, {metrics['total_bytes'] / 1024 / 1024:.1f} of "
+            f"{metrics['global_max_bytes'] / 1024 / 1024:.0f} MiB, {metrics['evicted']} evicted, "
+            f"{metrics['commit_conflicts']} concurrent-write retries."
+        )
+
+def render_latency_panel():
+    rows = latency_rows(st.session_state.get("last_trace_id"))
+    with st.sidebar.expander("⏱️ Latency (last action)", expanded=False):
+        if rows:
+            st.table(rows)
+        else:
+            st.caption("No timings recorded yet.")
+        faq = get_faq_cache().report()
+        st.caption(
+            f"FAQ cache: {faq['hits']} hits / {faq['hits'] + faq['misses']} cacheable questions "
+            f"({faq['hit_rate']:.0%}), ~{faq['saved_seconds']}s of agent time saved, {faq['entries']} entries."
+        )
+        if st.button("Clear FAQ cache"):
+            get_faq_cache().invalidate()
+
 # ---- STREAMLIT APP ----
 st.set_page_config(page_title="INTELLIBOT", page_icon="🤖", layout="centered")
 st.markdown(
@@ -183,97 +222,122 @@ st.markdown(
 st.markdown("<h1 style='text-align: center;'>🤖 INTELLIBOT</h1>", unsafe_allow_html=True)
 st.write("Welcome! Ask any HR hiring or interview scheduling questions in the chat. Type 'exit' to schedule interviews and finish the session.")
 
-if "history" not in st.session_state:
-    st.session_state.history = []
-if "scheduling_done" not in st.session_state:
-    st.session_state.scheduling_done = False
-if "scheduling_result" not in st.session_state:
-    st.session_state.scheduling_result = ""
-if "chat_mode" not in st.session_state:
-    st.session_state.chat_mode = True
-
-agent  = project_client.agents.get_agent(AGENT_ID)
-thread = project_client.agents.get_thread(THREAD_ID)
+if "context" not in st.session_state:
+    # Rebuilt from the stored history when this instance picks up a session another one started
+    st.session_state.context = ChatContext()
+    for turn in session.iter_history():
+        st.session_state.context.add_turn(turn["user"], turn["bot"])
+if "prewarmer" not in st.session_state:
+    st.session_state.prewarmer = Prewarmer(get_token_cache(), extract=extract_meeting_info,
+                                           warm_urls=[GRAPH_WARM_URL, GROQ_API_URL])
 
 # --- Chat window ---
-for msg in st.session_state.history:
+for msg in session.iter_history():
     with st.chat_message("user"):
         st.markdown(msg["user"])
     with st.chat_message("assistant"):
         st.markdown(msg["bot"])
 
-if st.session_state.chat_mode and not st.session_state.scheduling_done:
+if session.flags.get("chat_mode", True) and not session.flags.get("scheduling_done"):
     user_input = st.chat_input("Type your message and hit Enter…")
     if user_input:
         if user_input.strip().lower() == "exit":
-            st.session_state.chat_mode = False
+            session.flags["chat_mode"] = False
         else:
             with st.chat_message("user"):
                 st.markdown(user_input)
-            bot_reply = get_bot_reply(user_input, thread, agent)
+            with span("chat.turn", entry="app1") as turn:
+                bot_reply = get_cached_reply(user_input, get_thread(), get_agent(), st.session_state.context)
+                if st.session_state.context.needs_rollover:
+                    with span("agent.rollover"):
+                        st.session_state.thread = rollover_thread(get_project_client(), st.session_state.context)
+                        session.flags["thread_id"] = st.session_state.thread.id
+            st.session_state.last_trace_id = turn.trace_id
             with st.chat_message("assistant"):
                 st.markdown(bot_reply)
-            st.session_state.history.append({"user": user_input, "bot": bot_reply})
+            session.append_turn({"user": user_input, "bot": bot_reply})
+            # Start token / connection / extraction work early if a booking looks imminent
+            transcript = st.session_state.context.transcript()
+            st.session_state.prewarmer.trigger(scheduling_signal(bot_reply, transcript), transcript)
 
 # --- After exit, run scheduling ---
-if not st.session_state.chat_mode and not st.session_state.scheduling_done:
-    with st.chat_message("assistant"):
-        st.info("Thank you! Extracting meeting info and scheduling interviews...")
-    chat_file = save_chat_history(st.session_state.history)
-    with open(chat_file, "r", encoding="utf-8") as f:
-        chat_content = f.read()
-    try:
-        info = extract_meeting_info(chat_content)
-    except Exception as e:
-        with st.chat_message("assistant"):
-            st.error(f"Extraction failed: {e}")
-        st.session_state.scheduling_done = True
-        st.stop()
-    candidates = info.get('candidates', [])
-    if not candidates:
+# Claiming the flag first means only one instance ever sends this session's invites
+if (not session.flags.get("chat_mode", True) and not session.flags.get("scheduling_done")
+        and get_session_store().claim(session, "scheduling_done")):
+    with span("session.schedule", entry="app1") as root:
+        st.session_state.last_trace_id = root.trace_id
         with st.chat_message("assistant"):
-            st.error("No candidates found for scheduling.")
-        st.session_state.scheduling_done = True
-        st.stop()
-    try:
-        token = get_access_token()
-    except Exception as e:
-        with st.chat_message("assistant"):
-            st.error(f"Microsoft Graph Auth failed: {e}")
-        st.session_state.scheduling_done = True
-        st.stop()
-
-    success_count = 0
-    out_msgs = []
-    for idx, c in enumerate(candidates, 1):
-        if CANDIDATE_EMAIL_OVERRIDE:
-            c['email'] = CANDIDATE_EMAIL_OVERRIDE
-        interviewer = c.get('interviewer')
-        if not interviewer:
-            out_msgs.append(f"⚠️ Skipping Candidate {idx}: No interviewer data")
-            continue
-        required_fields = ['name', 'email', 'date', 'time']
-        missing = [field for field in required_fields if not c.get(field)]
-        if missing:
-            out_msgs.append(f"⚠️ Skipping Candidate {idx}: Missing fields {', '.join(missing)}")
-            continue
+            st.info("Thank you! Extracting meeting info and scheduling interviews...")
+        save_chat_history(session.iter_history())
+        chat_content = st.session_state.context.transcript()
+        prewarmer = st.session_state.prewarmer
+        prewarmer.trigger(1)
+        try:
+            info = prewarmer.extraction_for(chat_content) or extract_meeting_info(chat_content)
+        except Exception as e:
+            with st.chat_message("assistant"):
+                st.error(f"Extraction failed: {e}")
+            prewarmer.discard()
+            st.stop()
+        candidates = info.get('candidates', [])
+        if not candidates:
+            with st.chat_message("assistant"):
+                st.error("No candidates found for scheduling.")
+            prewarmer.discard()
+            st.stop()
         try:
-            success = create_teams_meeting(token, interviewer, c)
-            if success:
-                out_msgs.append(f"✅ Meeting {idx}: {c['name']} with {interviewer['name']} on {c['date']} at {c['time']} ({c['email']})")
-                success_count += 1
-        except Exception as err:
-            out_msgs.append(f"⚠️ Failed Candidate {idx}: {err}")
+            token = get_access_token()
+        except Exception as e:
+            with st.chat_message("assistant"):
+                st.error(f"Microsoft Graph Auth failed: {e}")
+            prewarmer.discard()
+            st.stop()
 
-    st.session_state.scheduling_result = "\n".join(out_msgs)
-    with st.chat_message("assistant"):
-        st.success(f"Successfully scheduled {success_count}/{len(candidates)} meetings!")
-        for msg in out_msgs:
-            st.write(msg)
-    st.session_state.scheduling_done = True
+        success_count = 0
+        out_msgs = []
+        for idx, c in enumerate(candidates, 1):
+            if CANDIDATE_EMAIL_OVERRIDE:
+                c['email'] = CANDIDATE_EMAIL_OVERRIDE
+            interviewer = c.get('interviewer')
+            if not interviewer:
+                out_msgs.append(f"⚠️ Skipping Candidate {idx}: No interviewer data")
+                continue
+            required_fields = ['name', 'email', 'date', 'time']
+            missing = [field for field in required_fields if not c.get(field)]
+            if missing:
+                out_msgs.append(f"⚠️ Skipping Candidate {idx}: Missing fields {', '.join(missing)}")
+                continue
+            try:
+                success = create_teams_meeting(token, interviewer, c)
+                if success:
+                    out_msgs.append(f"✅ Meeting {idx}: {c['name']} with {interviewer['name']} on {c['date']} at {c['time']} ({c['email']})")
+                    success_count += 1
+            except Exception as err:
+                out_msgs.append(f"⚠️ Failed Candidate {idx}: {err}")
+
+        session.flags["scheduling_result"] = "\n".join(out_msgs)
+        with st.chat_message("assistant"):
+            st.success(f"Successfully scheduled {success_count}/{len(candidates)} meetings!")
+            for msg in out_msgs:
+                st.write(msg)
+        prewarmer.discard()
 
 # Final summary if already done
-if st.session_state.scheduling_done:
+if session.flags.get("scheduling_done"):
     with st.chat_message("assistant"):
-        st.write("**Session complete. Reload the app to start new chat.**")
+        st.write("**Session complete.**")
+    # Reloading keeps ?sid= and resumes this session, so starting over needs a fresh id
+    if st.button("Start new chat"):
+        st.query_params.clear()
+        st.session_state.clear()
+        st.rerun()
+
+render_latency_panel()
+get_session_store().commit(session)
+render_memory_panel()
+get_session_store().enforce()
 
+# Warm the agent connection once the page is already on screen
+if session.flags.get("chat_mode", True):
+    get_agent()
+    get_thread()
@@ -0,0 +1,126 @@
+"""Latency / cost / accuracy benchmark for candidate extraction.
+
+Replays archived chats (``all_chat_history_sr_`` format) through the single-model
+path and the tiered router, and scores each against ``<chat>.expected.json``.
+Needs GROQ_API_KEY / GROQ_API_URL; prices are USD per million tokens.
+
+    python bench_extraction.py                                  # fixtures/extraction
+    python bench_extraction.py all_chat_history_sr_ --fast-price 0.05 --strong-price 0.59
+"""
+import os
+import re
+import glob
+import json
+import time
+import argparse
+
+from dotenv import load_dotenv
+
+# Load .env before the helper modules below read their settings at import time
+load_dotenv()
+
+import extraction
+from chat_context import ChatContext
+from tracing import span, spans_for
+
+FIELDS = ["name", "email", "interviewer.email", "date", "time"]
+
+
+def load_archive(path):
+    """ChatContext rebuilt from a file written by save_chat_history."""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    context = ChatContext()
+    for block in re.split(r'\n-{40}\n', text):
+        m = re.search(r'User: (.*?)\nBot: (.*)', block, re.DOTALL)
+        if m:
+            context.add_turn(m.group(1).strip(), m.group(2).strip())
+    return context
+
+
+def _field(c, name):
+    for part in name.split("."):
+        c = c.get(part) if isinstance(c, dict) else None
+    value = str(c or "").strip().lower()
+    if name == "time" and value:
+        from dateutil import parser
+        try:
+            return parser.parse(value).strftime("%H:%M")
+        except (ValueError, OverflowError):
+            pass
+    return value
+
+
+def score(got, expected):
+    """(matching fields, total expected fields), pairing candidates by email or name."""
+    got = [c for c in got.get("candidates", []) if isinstance(c, dict)]
+    hits = total = 0
+    for exp in expected.get("candidates", []):
+        match = next((c for c in got if _field(c, "email") == _field(exp, "email")
+                      or _field(c, "name") == _field(exp, "name")), {})
+        for f in FIELDS:
+            total += 1
+            hits += _field(match, f) == _field(exp, f)
+    return hits, total
+
+
+def single_model(transcript):
+    user = f"""Chat log:
+{transcript}
+
+Return JSON in this shape:
+{{
+  "candidates": [
+    {extraction.CANDIDATE_SHAPE}
+  ]
+}}"""
+    text, _ = extraction.call_groq(extraction.EXTRACTION_STRONG_MODEL, extraction.SYSTEM_PROMPT, user)
+    return extraction.parse_json_object(text)
+
+
+def run(mode, fn, cases, prices):
+    totals = {"ms": 0.0, "usd": 0.0, "hits": 0, "fields": 0, "errors": 0}
+    for path, transcript, expected in cases:
+        with span(f"bench.{mode}") as root:
+            start = time.perf_counter()
+            try:
+                got = fn(transcript)
+            except Exception as e:
+                print(f"  {mode:<7}{os.path.basename(path)}: failed ({e})")
+                got = {}
+                totals["errors"] += 1
+            totals["ms"] += (time.perf_counter() - start) * 1000
+        for s in spans_for(root.trace_id):
+            tokens = s.attributes.get("llm.usage.total_tokens") or 0
+            tier = "fast" if s.attributes.get("model") == extraction.EXTRACTION_FAST_MODEL else "strong"
+            totals["usd"] += tokens * prices[tier] / 1_000_000
+        hits, fields = score(got, expected)
+        totals["hits"] += hits
+        totals["fields"] += fields
+    n = max(len(cases), 1)
+    accuracy = totals["hits"] / max(totals["fields"], 1) * 100
+    print(f"{mode:<8} avg {totals['ms'] / n:8.0f} ms   avg ${totals['usd'] / n:.6f}   "
+          f"field accuracy {accuracy:5.1f}%   failures {totals['errors']}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("folder", nargs="?", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "extraction"))
+    ap.add_argument("--fast-price", type=float, default=0.06)
+    ap.add_argument("--strong-price", type=float, default=0.70)
+    args = ap.parse_args()
+
+    cases = []
+    for path in sorted(glob.glob(os.path.join(args.folder, "*.txt"))):
+        expected_path = path[:-4] + ".expected.json"
+        if not os.path.exists(expected_path):
+            continue
+        with open(expected_path, encoding="utf-8") as f:
+            cases.append((path, load_archive(path).transcript(), json.load(f)))
+    if not cases:
+        raise SystemExit(f"No chats with .expected.json found in {args.folder}")
+
+    prices = {"fast": args.fast_price, "strong": args.strong_price}
+    print(f"{len(cases)} chats; fast={extraction.EXTRACTION_FAST_MODEL} strong={extraction.EXTRACTION_STRONG_MODEL}")
+    run("single", single_model, cases, prices)
+    run("routed", extraction.extract_meeting_info, cases, prices)
@@ -0,0 +1,89 @@
+"""Startup-time benchmark for the Streamlit apps and the CLI.
+
+Runs each entry point's module-level imports under ``python -X importtime`` in a
+fresh interpreter and prints the cumulative cost per top-level package, next to
+the imports that are now deferred to first use.
+
+    python bench_startup.py                 # app.py, app1.py, main.py
+    python bench_startup.py app.py --top 5
+"""
+import os
+import re
+import ast
+import sys
+import argparse
+import subprocess
+
+ENTRY_POINTS = ["app.py", "app1.py", "main.py"]
+LINE_RE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+MISSING_RE = re.compile(r'^missing: (.*)$')
+
+
+def _import_source(nodes):
+    # Each import is guarded so one missing package does not hide the cost of the rest
+    stmts = dict.fromkeys(ast.unparse(n) for n in nodes)
+    return "\n".join(
+        f"try:\n    {stmt}\nexcept ImportError as e:\n    print('missing:', e, file=__import__('sys').stderr)"
+        for stmt in stmts
+    )
+
+
+def collect_imports(path):
+    """Split a script's imports into those run at startup and those deferred into functions."""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), path)
+    top = [n for n in tree.body if isinstance(n, (ast.Import, ast.ImportFrom))]
+    nested = [n for n in ast.walk(tree) if isinstance(n, (ast.Import, ast.ImportFrom)) and n not in top]
+    return _import_source(top), _import_source(nested)
+
+
+def _run_importtime(source, cwd):
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", source or "pass"],
+        cwd=cwd, capture_output=True, text=True
+    )
+    per_module, missing = {}, []
+    for line in proc.stderr.splitlines():
+        m = LINE_RE.match(line)
+        if m and len(m.group(3)) == 1:
+            name = m.group(4).split(".")[0]
+            per_module[name] = per_module.get(name, 0.0) + int(m.group(2)) / 1000
+        m = MISSING_RE.match(line)
+        if m:
+            missing.append(m.group(1))
+    return per_module, missing
+
+
+def measure(source, cwd, baseline):
+    """Cumulative import time (ms) per top-level package, excluding interpreter start-up."""
+    if not source:
+        return {}, 0.0, []
+    per_module, missing = _run_importtime(source, cwd)
+    per_module = {k: v for k, v in per_module.items() if k not in baseline}
+    return per_module, sum(per_module.values()), missing
+
+
+def report(path, top_n):
+    cwd = os.path.dirname(os.path.abspath(path))
+    baseline, _ = _run_importtime("", cwd)
+    startup, deferred = collect_imports(path)
+    print(f"== {os.path.basename(path)} ==")
+    for label, source in (("startup imports: ", startup), ("deferred imports:", deferred)):
+        mods, total, missing = measure(source, cwd, baseline)
+        suffix = " (paid on first use)" if label.startswith("deferred") else ""
+        print(f"  {label} {total:8.1f} ms{suffix}")
+        for name, ms in sorted(mods.items(), key=lambda kv: -kv[1])[:top_n]:
+            print(f"    {name:<28}{ms:8.1f} ms")
+        for err in dict.fromkeys(missing):
+            print(f"    not installed: {err}")
+    print()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("entries", nargs="*", default=ENTRY_POINTS)
+    ap.add_argument("--top", type=int, default=8, help="packages to list per section")
+    args = ap.parse_args()
+    here = os.path.dirname(os.path.abspath(__file__))
+    for entry in args.entries:
+        report(entry if os.path.isabs(entry) else os.path.join(here, entry), args.top)
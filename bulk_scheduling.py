@@ -0,0 +1,131 @@
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import throttle
+from tracing import span
+
+GRAPH_EVENTS_URL = "https://graph.microsoft.com/v1.0/users/{user}/events/{event_id}"
+MEETING_MINUTES  = 40
+MEETING_TIMEZONE = "Asia/Kolkata"
+BULK_WORKERS     = 8
+
+
+def normalize_date(value):
+    from dateutil import parser
+    return parser.parse(str(value)).date().isoformat() if value else ""
+
+
+def index_record(candidate, interviewer):
+    """Entry stored per Graph event id so bulk operations can find events by candidate, interviewer or date."""
+    return {
+        "name": candidate.get("name", ""),
+        "email": candidate.get("email", ""),
+        "interviewer_name": interviewer.get("name", ""),
+        "interviewer_email": interviewer.get("email", ""),
+        "date": normalize_date(candidate.get("date")),
+        "time": candidate.get("time", ""),
+        "job_profile": candidate.get("job_profile", ""),
+    }
+
+
+def select_events(index, candidates=None, interviewer=None, date=None):
+    """Event ids in `index` matching every given filter.
+
+    `candidates` is a collection of candidate names or emails; `interviewer` matches the
+    interviewer's name or email; `date` is anything `dateutil` can parse.
+    """
+    wanted = {c.strip().lower() for c in candidates} if candidates else None
+    interviewer = interviewer.strip().lower() if interviewer else None
+    date = normalize_date(date) if date else None
+    selected = []
+    for event_id, rec in index.items():
+        if wanted is not None and rec["email"].lower() not in wanted and rec["name"].lower() not in wanted:
+            continue
+        if interviewer and interviewer not in (rec["interviewer_email"].lower(), rec["interviewer_name"].lower()):
+            continue
+        if date and rec["date"] != date:
+            continue
+        selected.append(event_id)
+    return selected
+
+
+def _new_slot(rec, new_date=None, new_time=None, shift_minutes=None):
+    from dateutil import parser
+    start = parser.parse(f"{new_date or rec['date']} {new_time or rec['time']}")
+    if shift_minutes:
+        start += datetime.timedelta(minutes=shift_minutes)
+    return start
+
+
+def _run_bulk(action, event_ids, index, worker):
+    def run_one(event_id):
+        rec = index.get(event_id, {})
+        result = {"event_id": event_id, "name": rec.get("name", ""), "email": rec.get("email", ""),
+                  "ok": False, "error": ""}
+        try:
+            with span(f"graph.bulk_{action}", parent=parent):
+                if not rec:
+                    raise ValueError("event id not in the scheduled-events index")
+                result.update(worker(event_id, rec) or {})
+            result["ok"] = True
+        except Exception as e:
+            result["error"] = str(e)
+        return result
+
+    # Worker threads have no span stack of their own, so hand them the bulk span as parent
+    with span(f"bulk.{action}", events=len(event_ids)) as parent:
+        if not event_ids:
+            return []
+        with ThreadPoolExecutor(max_workers=min(BULK_WORKERS, len(event_ids))) as pool:
+            return list(pool.map(run_one, event_ids))
+
+
+def bulk_cancel(token, user_email, index, event_ids):
+    """Delete several Graph events concurrently. Returns one result dict per event (partial failures included)."""
+    headers = {"Authorization": f"Bearer {token}"}
+
+    def cancel(event_id, rec):
+        url = GRAPH_EVENTS_URL.format(user=user_email, event_id=event_id)
+        r = throttle.delete("graph", url, headers=headers)
+        if r.status_code not in (200, 204, 404):
+            r.raise_for_status()
+
+    return _run_bulk("cancel", event_ids, index, cancel)
+
+
+def bulk_reschedule(token, user_email, index, event_ids, new_date=None, new_time=None, shift_minutes=None):
+    """Move several Graph events in place with PATCH instead of delete + create.
+
+    Either set an absolute `new_date` / `new_time` (missing parts keep the event's own) or
+    shift every event by `shift_minutes`.
+    """
+    if not (new_date or new_time or shift_minutes):
+        raise ValueError("Give a new date, a new time or a shift in minutes")
+    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+
+    def reschedule(event_id, rec):
+        start = _new_slot(rec, new_date, new_time, shift_minutes)
+        end = start + datetime.timedelta(minutes=MEETING_MINUTES)
+        payload = {
+            "start": {"dateTime": start.isoformat(), "timeZone": MEETING_TIMEZONE},
+            "end": {"dateTime": end.isoformat(), "timeZone": MEETING_TIMEZONE},
+        }
+        url = GRAPH_EVENTS_URL.format(user=user_email, event_id=event_id)
+        r = throttle.request("graph", "PATCH", url, headers=headers, json=payload)
+        r.raise_for_status()
+        return {"date": start.date().isoformat(), "time": start.strftime("%I:%M %p")}
+
+    return _run_bulk("reschedule", event_ids, index, reschedule)
+
+
+def apply_results(index, action, results):
+    """Reflect successful bulk results in the index; returns (succeeded, failed) counts."""
+    for res in results:
+        if not res["ok"] or res["event_id"] not in index:
+            continue
+        if action == "cancel":
+            del index[res["event_id"]]
+        else:
+            index[res["event_id"]].update(date=res["date"], time=res["time"])
+    ok = sum(1 for r in results if r["ok"])
+    return ok, len(results) - ok
@@ -0,0 +1,158 @@
+import os
+import re
+
+# ---- CONFIGURATION ----
+CONTEXT_BUDGET_TOKENS       = int(os.getenv("CONTEXT_BUDGET_TOKENS", "3000"))
+CONTEXT_KEEP_RECENT         = int(os.getenv("CONTEXT_KEEP_RECENT", "6"))
+AGENT_CONTEXT_BUDGET_TOKENS = int(os.getenv("AGENT_CONTEXT_BUDGET_TOKENS", "8000"))
+# Share of the context budget that keyword-only facts may use; the oldest of those go first beyond it
+CONTEXT_FACT_SHARE          = float(os.getenv("CONTEXT_FACT_SHARE", "0.5"))
+
+# Sentences with an email, date, time or phone number are scheduling data: kept verbatim, never dropped.
+DATA_PATTERNS = [
+    re.compile(r'[\w\.-]+@[\w\.-]+'),
+    re.compile(r'\b\d{4}-\d{2}-\d{2}\b'),
+    re.compile(r'\b\d{1,2}(:\d{2})?\s*[APap]\.?[Mm]\.?'),
+    re.compile(r'\b\d{1,2}(st|nd|rd|th)?\s+(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\b', re.I),
+    re.compile(r'\+?\d[\d\s-]{8,}\d'),
+]
+# Sentences that only mention one of these are kept verbatim too, within the fact budget.
+KEYWORD_PATTERN = re.compile(
+    r'\b(candidate|interviewer|experience|notice period|skill|location|job profile|scheduled|cancelled)\b', re.I)
+FACT_PATTERNS = DATA_PATTERNS + [KEYWORD_PATTERN]
+
+_SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+|\n+')
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token) good enough for budgeting."""
+    return (len(text or "") + 3) // 4
+
+
+def extract_facts(text, skip_questions=False):
+    facts = []
+    for sentence in _SENTENCE_SPLIT.split(text or ""):
+        sentence = sentence.strip()
+        if skip_questions and sentence.endswith("?"):
+            continue
+        if sentence and any(p.search(sentence) for p in FACT_PATTERNS):
+            facts.append(sentence)
+    return facts
+
+
+def is_data_fact(fact):
+    """Q/A pairs and sentences carrying an email, date, time or phone number; compaction never drops these."""
+    return fact.startswith("Q: ") or any(p.search(fact) for p in DATA_PATTERNS)
+
+
+def questions(text):
+    """The question sentences of a bot reply, i.e. what the next user turn is answering."""
+    return " ".join(s.strip() for s in _SENTENCE_SPLIT.split(text or "") if s.strip().endswith("?"))
+
+
+class ChatContext:
+    """Token-budgeted view of a conversation.
+
+    Recent turns are kept verbatim; once they exceed the budget the oldest ones are
+    folded into a structured summary that keeps only candidate facts, word for word.
+    When a bot reply asked something, the question is kept together with the user's
+    answer, so bare answers such as a name or a skill list are not lost. Q/A pairs and
+    facts with an email, date, time or phone number are always kept; keyword-only facts
+    are capped at `fact_share` of the budget, dropping the oldest first.
+    """
+
+    def __init__(self, budget_tokens=CONTEXT_BUDGET_TOKENS, keep_recent=CONTEXT_KEEP_RECENT,
+                 agent_budget_tokens=AGENT_CONTEXT_BUDGET_TOKENS, fact_share=CONTEXT_FACT_SHARE):
+        self.budget_tokens = budget_tokens
+        self.keep_recent = keep_recent
+        self.agent_budget_tokens = agent_budget_tokens
+        self.fact_budget_tokens = int(budget_tokens * fact_share)
+        self.turns = []
+        self.summary = {"compacted_turns": 0, "facts": [], "dropped_facts": 0}
+        self.agent_prompt_tokens = 0
+
+    @property
+    def recent_tokens(self):
+        return sum(t["tokens"] for t in self.turns)
+
+    @property
+    def summary_tokens(self):
+        return sum(estimate_tokens(f) for f in self.summary["facts"])
+
+    @property
+    def total_tokens(self):
+        return self.recent_tokens + self.summary_tokens
+
+    @property
+    def needs_rollover(self):
+        """True once the agent thread's prompt has grown past its budget."""
+        return self.agent_prompt_tokens > self.agent_budget_tokens
+
+    def add_turn(self, user, bot, prompt_tokens=None):
+        self.turns.append({"user": user or "", "bot": bot or "",
+                           "tokens": estimate_tokens(user) + estimate_tokens(bot)})
+        if prompt_tokens is not None:
+            self.agent_prompt_tokens = prompt_tokens
+        self.compact()
+
+    def _add_fact(self, fact):
+        if fact and fact not in self.summary["facts"]:
+            self.summary["facts"].append(fact)
+
+    def compact(self):
+        while self.total_tokens > self.budget_tokens and len(self.turns) > self.keep_recent:
+            turn = self.turns.pop(0)
+            self.summary["compacted_turns"] += 1
+            if not turn.get("answered"):
+                for fact in extract_facts(turn["user"]):
+                    self._add_fact(fact)
+            for fact in extract_facts(turn["bot"], skip_questions=True):
+                self._add_fact(fact)
+            asked = questions(turn["bot"])
+            answer = self.turns[0]["user"].strip() if self.turns else ""
+            if asked and answer:
+                self._add_fact(f"Q: {asked} A: {answer}")
+                self.turns[0]["answered"] = True
+            elif asked and not self.turns:
+                self._add_fact(f"Q: {asked}")
+        soft = [f for f in self.summary["facts"] if not is_data_fact(f)]
+        soft_tokens = sum(estimate_tokens(f) for f in soft)
+        while soft_tokens > self.fact_budget_tokens and soft:
+            fact = soft.pop(0)
+            self.summary["facts"].remove(fact)
+            self.summary["dropped_facts"] += 1
+            soft_tokens -= estimate_tokens(fact)
+
+    def summary_text(self):
+        if not self.summary["facts"]:
+            return ""
+        return "Known facts:\n" + "\n".join(f"- {f}" for f in self.summary["facts"])
+
+    def transcript(self):
+        """Minimal extraction-oriented transcript: retained facts, then recent turns."""
+        parts = []
+        summary = self.summary_text()
+        if summary:
+            parts.append(summary)
+        for t in self.turns:
+            if t["user"]:
+                parts.append(f"U: {t['user']}")
+            if t["bot"]:
+                parts.append(f"A: {t['bot']}")
+        return "\n".join(parts)
+
+    def rollover_seed(self):
+        """Message that opens a fresh agent thread in place of the oversized one."""
+        self.agent_prompt_tokens = 0
+        return "Summary of our conversation so far (context only, no reply needed):\n" + self.transcript()
+
+
+def rollover_thread(project_client, context):
+    """Replace an agent thread whose prompt exceeded the budget with a compact, seeded one."""
+    thread = project_client.agents.create_thread()
+    project_client.agents.create_message(
+        thread_id=thread.id,
+        role="user",
+        content=context.rollover_seed()
+    )
+    return thread
@@ -0,0 +1,239 @@
+import os
+import re
+import json
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import throttle
+from tracing import span, record_usage
+
+# ---- CONFIGURATION ----
+GROQ_API_KEY              = os.getenv("GROQ_API_KEY")
+GROQ_API_URL              = os.getenv("GROQ_API_URL")
+EXTRACTION_STRONG_MODEL   = os.getenv("EXTRACTION_STRONG_MODEL") or os.getenv("MODEL_NAME")
+EXTRACTION_FAST_MODEL     = os.getenv("EXTRACTION_FAST_MODEL", "llama-3.1-8b-instant")
+EXTRACTION_MIN_CONFIDENCE = float(os.getenv("EXTRACTION_MIN_CONFIDENCE", "0.7"))
+
+EMAIL_RE    = re.compile(r'^[\w\.\+-]+@[\w-]+(\.[\w-]+)+$')
+ISO_DATE_RE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+SYSTEM_PROMPT = (
+    "Extract all candidates with their respective interviewer details (name, email), date, time from the chat. "
+    "Return ONLY a single valid JSON object. Output ONLY valid minified JSON. Use double quotes. "
+    "Do not include explanations, comments, or markdown."
+)
+
+CANDIDATE_SHAPE = """{
+      "name": "Candidate Name",
+      "email": "email@example.com",
+      "interviewer": {
+        "name": "Interviewer Name",
+        "email": "interviewer@example.com"
+      },
+      "date": "YYYY-MM-DD",
+      "time": "HH:MM AM/PM",
+      "product": "Interview",
+      "confidence": 0.0
+    }"""
+
+TABLE_SYSTEM_PROMPT = (
+    "Extract all candidates and all their available key skills from the chat. "
+    "For each candidate, show every skill present (do not skip any key skill). "
+    "Return ONLY a single valid JSON object. Output ONLY valid minified JSON. Use double quotes. "
+    "Do not include explanations, comments, or markdown."
+)
+
+TABLE_SHAPE = """{
+      "Name": "Candidate Name",
+      "Email": "email@example.com",
+      "Key Skill": "skill one, skill two",
+      "Total Experience": "",
+      "Relevant Experience": "",
+      "Location": "",
+      "Notice Period": "",
+      "Interviewer Name": "",
+      "Interviewer Email": "",
+      "Date": "YYYY-MM-DD",
+      "Time": "HH:MM AM/PM",
+      "Job Profile": "",
+      "confidence": 0.0
+    }"""
+
+
+def call_groq(model, system, user):
+    """One chat completion; returns (text, usage)."""
+    payload = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": system},
+            {"role": "user",   "content": user}
+        ],
+        "temperature": 0
+    }
+    headers = {"Authorization": f"Bearer {GROQ_API_KEY}", "Content-Type": "application/json"}
+    with span("groq.extract", model=model) as sp:
+        resp = throttle.post("groq", GROQ_API_URL, json=payload, headers=headers)
+        resp.raise_for_status()
+        body = resp.json()
+        record_usage(body.get("usage"), sp)
+    return body['choices'][0]['message']['content'], body.get("usage") or {}
+
+
+def parse_json_object(text):
+    m = re.search(r'\{[\s\S]*\}', text or "")
+    if not m:
+        raise ValueError("Could not parse JSON from LLM response. Raw text:\n" + (text or ""))
+    try:
+        return json.loads(m.group(0))
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Failed to parse JSON ({e}). Raw extracted string:\n{m.group(0)}")
+
+
+def validate_candidate(c):
+    """Schema problems with one extracted candidate; an empty list means it is usable as is."""
+    from dateutil import parser
+    if not isinstance(c, dict):
+        return ["not an object"]
+    errors = []
+    if not str(c.get("name") or "").strip():
+        errors.append("name missing")
+    if not EMAIL_RE.match(str(c.get("email") or "")):
+        errors.append("invalid email")
+    date = str(c.get("date") or "")
+    try:
+        if not ISO_DATE_RE.match(date):
+            raise ValueError
+        datetime.date.fromisoformat(date)
+    except ValueError:
+        errors.append("date not ISO YYYY-MM-DD")
+    try:
+        parser.parse(str(c.get("time") or ""))
+    except (ValueError, OverflowError):
+        errors.append("unparseable time")
+    interviewer = c.get("interviewer")
+    if not isinstance(interviewer, dict) or not str(interviewer.get("name") or "").strip():
+        errors.append("interviewer missing")
+    elif not EMAIL_RE.match(str(interviewer.get("email") or "")):
+        errors.append("invalid interviewer email")
+    try:
+        if float(c.get("confidence", 1.0)) < EXTRACTION_MIN_CONFIDENCE:
+            errors.append("low confidence")
+    except (TypeError, ValueError):
+        pass
+    return errors
+
+
+def validate_table_row(row):
+    """Schema problems with one candidate-table row; details the chat never gave may stay empty."""
+    from dateutil import parser
+    if not isinstance(row, dict):
+        return ["not an object"]
+    errors = []
+    if not str(row.get("Name") or "").strip():
+        errors.append("Name missing")
+    if not EMAIL_RE.match(str(row.get("Email") or "")):
+        errors.append("invalid Email")
+    if row.get("Interviewer Email") and not EMAIL_RE.match(str(row["Interviewer Email"])):
+        errors.append("invalid Interviewer Email")
+    if row.get("Date"):
+        try:
+            if not ISO_DATE_RE.match(str(row["Date"])):
+                raise ValueError
+            datetime.date.fromisoformat(str(row["Date"]))
+        except ValueError:
+            errors.append("Date not ISO YYYY-MM-DD")
+    if row.get("Time"):
+        try:
+            parser.parse(str(row["Time"]))
+        except (ValueError, OverflowError):
+            errors.append("unparseable Time")
+    try:
+        if float(row.get("confidence", 1.0)) < EXTRACTION_MIN_CONFIDENCE:
+            errors.append("low confidence")
+    except (TypeError, ValueError):
+        pass
+    return errors
+
+
+def relevant_turns(transcript, candidate):
+    """Transcript lines that mention this candidate (by name or email) plus the line that follows each."""
+    keys = [str(candidate.get(k) or candidate.get(k.title()) or "").strip().lower()
+            for k in ("name", "email")] if isinstance(candidate, dict) else []
+    keys = [k for k in keys if k]
+    lines = transcript.splitlines()
+    keep = set()
+    for i, line in enumerate(lines):
+        if any(k in line.lower() for k in keys):
+            keep.update((i, i + 1))
+    picked = [lines[i] for i in sorted(keep) if i < len(lines)]
+    return "\n".join(picked) if picked else transcript
+
+
+def _reask(system, shape, transcript, candidate, errors):
+    user = f"""Relevant chat turns:
+{relevant_turns(transcript, candidate)}
+
+A first pass extracted this record, which has problems ({', '.join(errors)}):
+{json.dumps(candidate)}
+
+Return ONLY the corrected record for this one candidate, as JSON in this shape:
+{shape}"""
+    text, _ = call_groq(EXTRACTION_STRONG_MODEL, system, user)
+    fixed = parse_json_object(text)
+    return fixed.get("candidates", [fixed])[0] if "candidates" in fixed else fixed
+
+
+def _route(system, shape, chat_content, validate, kind):
+    """Tiered extraction: a fast model first, the strong model only for records that fail validation."""
+    user = f"""Chat log:
+{chat_content}
+
+Return JSON in this shape:
+{{
+  "candidates": [
+    {shape}
+  ]
+}}"""
+    with span("extract.route", kind=kind, fast_model=EXTRACTION_FAST_MODEL,
+              strong_model=EXTRACTION_STRONG_MODEL) as route:
+        try:
+            text, _ = call_groq(EXTRACTION_FAST_MODEL, system, user)
+            candidates = parse_json_object(text).get("candidates") or []
+            if not candidates and re.search(r'[\w\.-]+@[\w\.-]+', chat_content):
+                raise ValueError("fast model found no candidates")
+            invalid = [(i, errs) for i, errs in enumerate(map(validate, candidates)) if errs]
+        except Exception:
+            # Unusable first pass: fall back to a single full-log call on the strong model
+            route.set_attribute("extract.fast_failed", True)
+            text, _ = call_groq(EXTRACTION_STRONG_MODEL, system, user)
+            candidates = parse_json_object(text).get("candidates") or []
+            invalid = []
+
+        route.set_attribute("extract.candidates", len(candidates))
+        route.set_attribute("extract.escalated", len(invalid))
+        if invalid:
+            def fix(item):
+                i, errs = item
+                with span("extract.reask", parent=route, errors=", ".join(errs)):
+                    try:
+                        fixed = _reask(system, shape, chat_content, candidates[i], errs)
+                    except Exception:
+                        return i, candidates[i]
+                    return i, fixed if len(validate(fixed)) <= len(errs) else candidates[i]
+            with ThreadPoolExecutor(max_workers=min(4, len(invalid))) as pool:
+                for i, fixed in pool.map(fix, invalid):
+                    candidates[i] = fixed
+        for c in candidates:
+            if isinstance(c, dict):
+                c.pop("confidence", None)
+        return candidates
+
+
+def extract_meeting_info(chat_content):
+    """Candidates with interviewer, date and time for scheduling: {"candidates": [...]}."""
+    return {"candidates": _route(SYSTEM_PROMPT, CANDIDATE_SHAPE, chat_content, validate_candidate, "meeting")}
+
+
+def extract_candidate_table(chat_content):
+    """One row per candidate with every key skill and profile detail, for the results table."""
+    return _route(TABLE_SYSTEM_PROMPT, TABLE_SHAPE, chat_content, validate_table_row, "table")
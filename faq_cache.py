@@ -0,0 +1,246 @@
+import os
+import re
+import math
+import time
+import hashlib
+import threading
+from collections import Counter
+
+from tracing import span
+from chat_context import questions
+
+# ---- CONFIGURATION ----
+FAQ_CACHE_TTL        = int(os.getenv("FAQ_CACHE_TTL", str(24 * 3600)))
+FAQ_CACHE_SIMILARITY = float(os.getenv("FAQ_CACHE_SIMILARITY", "0.85"))
+FAQ_CACHE_MAX        = int(os.getenv("FAQ_CACHE_MAX", "500"))
+FAQ_MIN_WORDS        = int(os.getenv("FAQ_MIN_WORDS", "3"))
+
+# Anything that identifies a candidate, a slot or a booking must never be cached or served from cache
+CANDIDATE_DATA = [
+    re.compile(r'[\w\.-]+@[\w\.-]+'),
+    re.compile(r'\+?\d[\d\s-]{7,}\d'),
+    re.compile(r'\b\d{4}-\d{2}-\d{2}\b|\b\d{1,2}[/-]\d{1,2}([/-]\d{2,4})?\b'),
+    re.compile(r'\b\d{1,2}(:\d{2})?\s*[ap]\.?m\b', re.I),
+    re.compile(r'\b(today|tomorrow|monday|tuesday|wednesday|thursday|friday|saturday|sunday)\b', re.I),
+    re.compile(r'\b\d{1,2}(st|nd|rd|th)?\s+(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\b', re.I),
+    re.compile(r'\b(candidate|interviewer)\s+(is|named|called)\b|\b(schedule|reschedule|cancel|book)\b.*\b(for|with)\b', re.I),
+    re.compile(r'[✅❌]'),
+]
+# Names in running text: "Rahul's", "Dr. Rao", or two capitalised words after a lower-case word
+NAMES = [
+    re.compile(r"\b[A-Z][a-z]+'s\b"),
+    re.compile(r'\b(Mr|Mrs|Ms|Dr)\.?\s+[A-Z]'),
+    re.compile(r'(?<=[a-z,] )[A-Z][a-z]+\s+[A-Z][a-z]+\b'),
+]
+# A question that points back into the conversation ("the candidate", "she", "When is Priya free?")
+# only has an answer inside that session
+REFERS_BACK = [
+    re.compile(r'\b(candidates?|interviewers?|this|these|those|he|she|they|him|them|his|her|hers|their)\b', re.I),
+    re.compile(r'(?<=[\w,;:] )[A-Z][a-z]+'),
+]
+# Answers about a particular person's profile, even when no name or email is left in them
+PROFILE_ANSWER = re.compile(r'\b(candidates?|interviewers?|experience|notice period|skills?)\b', re.I)
+INTERROGATIVE = re.compile(r"^\s*(what|what's|how|when|where|which|who|why|can|could|do|does|is|are|should|will|"
+                           r"would|may|tell|explain|describe|list)\b", re.I)
+STOPWORDS = set("a an the is are was were be to of in on for and or do does did i we you our my me it this that "
+                "what how can could should would please tell about with any there".split())
+
+
+def has_candidate_data(text):
+    return any(p.search(text or "") for p in CANDIDATE_DATA)
+
+
+def mentions_name(text):
+    return any(p.search(text or "") for p in NAMES)
+
+
+def refers_back(text):
+    return any(p.search(text or "") for p in REFERS_BACK)
+
+
+def is_question(text):
+    """A standalone question: long enough and phrased as one, so "yes" or a bare name never qualifies."""
+    text = (text or "").strip()
+    return len(normalize(text).split()) >= FAQ_MIN_WORDS and (text.endswith("?") or bool(INTERROGATIVE.match(text)))
+
+
+def cacheable_turn(question, previous_reply=None):
+    """Only the opening question or one the agent did not prompt for may be served from or stored in the cache.
+
+    A reply to an agent question ("What is the candidate's name?") is part of that conversation
+    and means nothing in another session; so is a question about "the candidate", "her" or "Priya".
+    """
+    if previous_reply and questions(previous_reply):
+        return False
+    return (is_question(question) and not has_candidate_data(question) and not mentions_name(question)
+            and not refers_back(question))
+
+
+def cacheable_answer(answer):
+    """Only generic answers may be shared: nothing about a candidate's slot, contact details or profile."""
+    return not (has_candidate_data(answer) or mentions_name(answer) or PROFILE_ANSWER.search(answer or ""))
+
+
+def normalize(text):
+    return " ".join(re.findall(r'[a-z0-9]+', (text or "").lower()))
+
+
+def _terms(text):
+    # Crude plural folding so "interviews" and "interview" share a term
+    return [w[:-1] if len(w) > 3 and w.endswith("s") else w
+            for w in normalize(text).split() if w not in STOPWORDS]
+
+
+def agent_fingerprint(agent):
+    """Changes whenever the agent's model, instructions or tools change, invalidating cached answers."""
+    parts = [str(getattr(agent, k, "")) for k in ("id", "model", "instructions", "tools", "temperature", "top_p")]
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+
+
+class FAQCache:
+    """Question -> answer cache in front of the agent for generic HR questions.
+
+    Lookup is a normalized exact match first, then TF-IDF cosine similarity over cached
+    questions. Entries expire after a TTL and are all dropped when the agent fingerprint changes.
+    With a state backend the entries are shared by every app instance; writes are optimistic
+    read-modify-writes, and each instance re-reads them only when the shared version moves.
+    """
+
+    def __init__(self, ttl=FAQ_CACHE_TTL, threshold=FAQ_CACHE_SIMILARITY, max_entries=FAQ_CACHE_MAX,
+                 backend=None, key="faq_cache"):
+        self.ttl = ttl
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.backend = backend
+        self.key = key
+        self.state = {"fingerprint": None, "entries": {}}
+        self.version = None
+        self.df = Counter()
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "bypassed": 0, "saved_seconds": 0.0, "miss_seconds": 0.0}
+
+    @property
+    def entries(self):
+        return self.state["entries"]
+
+    @property
+    def fingerprint(self):
+        return self.state["fingerprint"]
+
+    def _load(self, state):
+        self.state = state
+        self.df = Counter()
+        for e in state["entries"].values():
+            self.df.update(set(e["terms"]))
+
+    def _pull(self):
+        if self.backend is None:
+            return
+        state, version = self.backend.get_json(self.key, {"fingerprint": None, "entries": {}})
+        if version != self.version:
+            self._load(state)
+            self.version = version
+
+    def _apply(self, fn):
+        """Run `fn(state)` (which mutates and returns it) on the shared state, or the local one."""
+        if self.backend is None:
+            self._load(fn(self.state))
+            return
+        state = self.backend.update_json(self.key, fn, default={"fingerprint": None, "entries": {}})
+        self._load(state)
+        self.version = None  # re-read on next lookup to pick up the new version number
+
+    def _vector(self, terms):
+        n = max(len(self.entries), 1)
+        tf = Counter(terms)
+        vec = {t: c * (math.log((1 + n) / (1 + self.df[t])) + 1) for t, c in tf.items()}
+        norm = math.sqrt(sum(v * v for v in vec.values())) or 1.0
+        return {t: v / norm for t, v in vec.items()}
+
+    def invalidate(self, fingerprint=None):
+        """Clear everything; with a fingerprint, only if it differs from the one the entries were built for."""
+        with self.lock:
+            self._pull()
+            if fingerprint is not None and fingerprint == self.fingerprint:
+                return
+
+            def clear(state):
+                if fingerprint is None or state["fingerprint"] != fingerprint:
+                    state = {"fingerprint": fingerprint, "entries": {}}
+                return state
+            self._apply(clear)
+
+    def get(self, question, previous_reply=None):
+        if not cacheable_turn(question, previous_reply):
+            with self.lock:
+                self.stats["bypassed"] += 1
+            return None
+        key = normalize(question)
+        now = time.time()
+        with self.lock:
+            self._pull()
+            live = {k: e for k, e in self.entries.items() if now - e["stored"] <= self.ttl}
+            entry = live.get(key)
+            if entry is None and live:
+                query = self._vector(_terms(question))
+                best, best_score = None, 0.0
+                for e in live.values():
+                    vec = self._vector(e["terms"])
+                    score = sum(w * vec.get(t, 0.0) for t, w in query.items())
+                    if score > best_score:
+                        best, best_score = e, score
+                if best_score >= self.threshold:
+                    entry = best
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+            self.stats["saved_seconds"] += entry["seconds"]
+            return entry["answer"]
+
+    def put(self, question, answer, seconds, previous_reply=None):
+        if not cacheable_turn(question, previous_reply) or not cacheable_answer(answer):
+            return
+        key = normalize(question)
+        entry = {"answer": answer, "terms": _terms(question), "stored": time.time(), "seconds": seconds}
+
+        def add(state):
+            entries = state["entries"]
+            for k in [k for k, e in entries.items() if entry["stored"] - e["stored"] > self.ttl]:
+                del entries[k]
+            entries.pop(key, None)
+            if len(entries) >= self.max_entries:
+                del entries[min(entries, key=lambda k: entries[k]["stored"])]
+            entries[key] = entry
+            return state
+        with self.lock:
+            self._apply(add)
+
+    def answer(self, question, compute, previous_reply=None):
+        """Cached answer for `question`, else `compute()` (the agent call) stored for next time.
+
+        `previous_reply` is the agent's last message in this conversation, if any. Returns (answer, hit).
+        """
+        with span("faq_cache.lookup") as sp:
+            cached = self.get(question, previous_reply)
+            sp.set_attribute("cache.hit", cached is not None)
+        if cached is not None:
+            return cached, True
+        start = time.perf_counter()
+        result = compute()
+        seconds = time.perf_counter() - start
+        with self.lock:
+            self.stats["miss_seconds"] += seconds
+        self.put(question, result, seconds, previous_reply)
+        return result, False
+
+    def report(self):
+        with self.lock:
+            s = dict(self.stats)
+            lookups = s["hits"] + s["misses"]
+            s["entries"] = len(self.entries)
+            s["hit_rate"] = round(s["hits"] / lookups, 3) if lookups else 0.0
+            s["saved_seconds"] = round(s["saved_seconds"], 1)
+            agent_calls = s["misses"] + s["bypassed"]
+            s["avg_agent_seconds"] = round(s.pop("miss_seconds") / agent_calls, 2) if agent_calls else 0.0
+            return s
@@ -0,0 +1,144 @@
+import os
+import re
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import throttle
+from tracing import span
+
+# Minimum chat turns between two speculative extractions, so they don't eat the Groq quota
+PREWARM_EXTRACT_EVERY = int(os.getenv("PREWARM_EXTRACT_EVERY", "2"))
+
+# Agent replies that suggest a booking is coming up soon
+SCHEDULING_SIGNAL = re.compile(r'interviewer|schedul|time slot|confirm|availability|book', re.I)
+# Replies that ask for the interviewer's name or a final go-ahead: the details are then usually complete
+READY_SIGNAL      = re.compile(r"interviewer'?s? name|\bconfirm|shall i (schedule|book)|should i (schedule|book)|"
+                               r"go ahead|all set", re.I)
+EMAIL             = re.compile(r'[\w\.-]+@[\w\.-]+\.\w+')
+GRAPH_WARM_URL    = "https://graph.microsoft.com/v1.0/$metadata"
+
+
+def scheduling_signal(reply, transcript=""):
+    """0 = nothing to do, 1 = warm token and connections, 2 = also extract candidates speculatively."""
+    if not reply or not SCHEDULING_SIGNAL.search(reply):
+        return 0
+    if READY_SIGNAL.search(reply) and EMAIL.search(transcript or reply):
+        return 2
+    return 1
+
+
+class TokenCache:
+    """Caches the Graph client-credentials token until shortly before it expires.
+
+    The token can write any user's calendar, so it stays in this process's memory and is never
+    put in the shared state backend; each instance fetching its own costs one request an hour.
+    """
+
+    def __init__(self, fetch, margin=300):
+        self.fetch = fetch
+        self.margin = margin
+        self.token = None
+        self.expires_at = 0.0
+        self.lock = threading.Lock()
+
+    def get(self):
+        with self.lock:
+            if not self.token or time.monotonic() >= self.expires_at:
+                data = self.fetch()
+                self.token = data['access_token']
+                self.expires_at = time.monotonic() + int(data.get('expires_in', 3600)) - self.margin
+            return self.token
+
+
+class Prewarmer:
+    """Speculative, discardable scheduling work started while the chat is still going.
+
+    Token refresh and connection warm-up are idempotent; speculative extraction is keyed by
+    a hash of the transcript so it is only reused if nothing was said after it started.
+    Extractions start at most once every `extract_every` triggers and never while one is
+    still running (a started Groq call cannot be cancelled); `refresh`, used after the app
+    appends to the transcript itself (e.g. a booking confirmation), counts as a trigger.
+    """
+
+    def __init__(self, tokens, extract=None, warm_urls=(), extract_every=PREWARM_EXTRACT_EVERY):
+        self.tokens = tokens
+        self.extract = extract
+        self.warm_urls = [u for u in warm_urls if u]
+        self.extract_every = extract_every
+        self.pool = ThreadPoolExecutor(max_workers=3, thread_name_prefix="prewarm")
+        self.warmed = None
+        self.token_future = None
+        self.extraction = (None, None)
+        self.triggers = 0
+        self.extracted_at = None
+
+    def trigger(self, level, transcript=""):
+        if level <= 0 or self.pool is None:
+            return
+        self.triggers += 1
+        if self.token_future is None or self.token_future.done():
+            self.token_future = self.pool.submit(self._fetch_token)
+        if self.warmed is None:
+            self.warmed = self.pool.submit(self._warm_connections)
+        if level >= 2 and (self.extracted_at is None or self.triggers - self.extracted_at >= self.extract_every):
+            self._start_extraction(transcript)
+
+    def refresh(self, transcript):
+        """Re-key a speculative extraction to `transcript` after the app appended to it, within the debounce."""
+        if self.pool is None or self.extraction[0] is None:
+            return
+        self.triggers += 1
+        if self.triggers - self.extracted_at >= self.extract_every:
+            self._start_extraction(transcript)
+
+    def _start_extraction(self, transcript):
+        if not self.extract or not transcript:
+            return
+        key = hashlib.sha1(transcript.encode("utf-8")).hexdigest()
+        old_key, old_future = self.extraction
+        if key != old_key:
+            if old_future is not None and not old_future.cancel() and not old_future.done():
+                return  # already running; exit-time extraction catches up if the transcript moved on
+            self.extraction = (key, self.pool.submit(self._extract, transcript))
+            self.extracted_at = self.triggers
+
+    def _fetch_token(self):
+        with span("prewarm.token"):
+            return self.tokens.get()
+
+    def _warm_connections(self):
+        with span("prewarm.connections", hosts=len(self.warm_urls)):
+            for url in self.warm_urls:
+                try:
+                    throttle.session().head(url, timeout=5)
+                except Exception:
+                    pass
+
+    def _extract(self, transcript):
+        with span("prewarm.extract"):
+            return self.extract(transcript)
+
+    def extraction_for(self, transcript):
+        """Result of the speculative extraction if it ran on exactly this transcript, else None."""
+        key, future = self.extraction
+        if future is None or future.cancelled():
+            return None
+        if key != hashlib.sha1(transcript.encode("utf-8")).hexdigest():
+            return None
+        try:
+            return future.result()
+        except Exception:
+            return None
+
+    def discard(self):
+        """Drop any speculative work, e.g. when the session ends without scheduling."""
+        if self.pool is None:
+            return
+        _, future = self.extraction
+        if future is not None:
+            future.cancel()
+        self.extraction = (None, None)
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self.pool = None
@@ -0,0 +1,184 @@
+"""In-memory Redis-protocol stand-in for local development and for the state backend tests.
+
+Implements only the commands RedisBackend uses (GET/SET EX NX/DEL/INCR/WATCH/MULTI/EXEC ...),
+with Redis' optimistic-locking semantics for WATCH.
+
+    python resp_standin.py --port 6380          # then STATE_BACKEND=redis STATE_REDIS_URL=redis://localhost:6380/0
+"""
+import time
+import argparse
+import threading
+import socketserver
+
+
+ABORTED = object()  # EXEC after a watched key changed: null array reply
+
+
+class Store:
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self.revision = {}
+        self.lock = threading.Lock()
+
+    def _alive(self, key):
+        exp = self.expires.get(key)
+        if exp is not None and exp <= time.time():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+            self._touch(key)
+        return key in self.data
+
+    def _touch(self, key):
+        self.revision[key] = self.revision.get(key, 0) + 1
+
+    def execute(self, cmd, args):
+        """Run one command under the lock; returns a reply value or raises ValueError for -ERR."""
+        name = cmd.upper()
+        if name == b"PING":
+            return "PONG"
+        if name in (b"AUTH", b"SELECT", b"UNWATCH"):
+            return "OK"
+        if name == b"GET":
+            return self.data.get(args[0]) if self._alive(args[0]) else None
+        if name == b"SET":
+            key, value, opts = args[0], args[1], [a.upper() for a in args[2:]]
+            if b"NX" in opts and self._alive(key):
+                return None
+            self.data[key] = value
+            self.expires.pop(key, None)
+            if b"EX" in opts:
+                self.expires[key] = time.time() + int(args[2 + opts.index(b"EX") + 1])
+            self._touch(key)
+            return "OK"
+        if name == b"DEL":
+            n = 0
+            for key in args:
+                if self._alive(key):
+                    del self.data[key]
+                    self.expires.pop(key, None)
+                    self._touch(key)
+                    n += 1
+            return n
+        if name == b"INCR":
+            key = args[0]
+            n = int(self.data[key]) + 1 if self._alive(key) else 1
+            self.data[key] = str(n).encode()
+            self._touch(key)
+            return n
+        if name == b"FLUSHDB":
+            for key in list(self.data):
+                self._touch(key)
+            self.data.clear()
+            self.expires.clear()
+            return "OK"
+        raise ValueError(f"unknown command '{name.decode()}'")
+
+
+def encode(reply):
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, str):
+        return b"+%s\r\n" % reply.encode()
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    if isinstance(reply, bytes):
+        return b"$%d\r\n%s\r\n" % (len(reply), reply)
+    if isinstance(reply, list):
+        return b"*%d\r\n" % len(reply) + b"".join(encode(r) for r in reply)
+    raise TypeError(reply)
+
+
+class Handler(socketserver.StreamRequestHandler):
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        n = int(line[1:-2])
+        args = []
+        for _ in range(n):
+            size = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(size + 2)[:-2])
+        return args
+
+    def handle(self):
+        store = self.server.store
+        watched = {}
+        queued = None
+        while True:
+            args = self.read_command()
+            if args is None:
+                return
+            name, rest = args[0].upper(), args[1:]
+            with store.lock:
+                if name == b"WATCH":
+                    for key in rest:
+                        store._alive(key)
+                        watched[key] = store.revision.get(key, 0)
+                    reply = "OK"
+                elif name == b"UNWATCH":
+                    watched = {}
+                    reply = "OK"
+                elif name == b"MULTI":
+                    queued = []
+                    reply = "OK"
+                elif name == b"DISCARD":
+                    queued, watched = None, {}
+                    reply = "OK"
+                elif name == b"EXEC":
+                    for key in watched:
+                        store._alive(key)
+                    if any(store.revision.get(k, 0) != rev for k, rev in watched.items()):
+                        reply = ABORTED
+                    else:
+                        reply = []
+                        for cmd, cargs in queued or []:
+                            try:
+                                reply.append(store.execute(cmd, cargs))
+                            except ValueError as e:
+                                reply.append(e)
+                    queued, watched = None, {}
+                elif queued is not None:
+                    queued.append((name, rest))
+                    reply = "QUEUED"
+                else:
+                    try:
+                        reply = store.execute(name, rest)
+                    except ValueError as e:
+                        reply = e
+            if reply is ABORTED:
+                out = b"*-1\r\n"
+            elif isinstance(reply, ValueError):
+                out = b"-ERR %s\r\n" % str(reply).encode()
+            elif isinstance(reply, list):
+                out = b"*%d\r\n" % len(reply) + b"".join(
+                    b"-ERR %s\r\n" % str(r).encode() if isinstance(r, ValueError) else encode(r) for r in reply)
+            else:
+                out = encode(reply)
+            self.wfile.write(out)
+
+
+class StandinServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address):
+        super().__init__(address, Handler)
+        self.store = Store()
+
+
+def serve(port=0):
+    """Start a stand-in on localhost in a background thread; returns the server (see .server_address)."""
+    server = StandinServer(("127.0.0.1", port))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--port", type=int, default=6380)
+    args = ap.parse_args()
+
+    print(f"RESP stand-in listening on 127.0.0.1:{args.port}")
+    server = StandinServer(("127.0.0.1", args.port))
+    server.serve_forever()
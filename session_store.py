@@ -0,0 +1,313 @@
+import os
+import io
+import sys
+import copy
+import gzip
+import json
+import time
+import uuid
+import threading
+
+from state_backend import Conflict, get_backend
+
+# ---- CONFIGURATION ----
+SESSION_HOT_TURNS         = int(os.getenv("SESSION_HOT_TURNS", "20"))
+SESSION_MAX_BYTES         = int(os.getenv("SESSION_MAX_BYTES", str(2 * 1024 * 1024)))
+SESSION_GLOBAL_MAX_BYTES  = int(os.getenv("SESSION_GLOBAL_MAX_BYTES", str(256 * 1024 * 1024)))
+SESSION_IDLE_TTL          = int(os.getenv("SESSION_IDLE_TTL", "1800"))
+SESSION_RETENTION         = int(os.getenv("SESSION_RETENTION", str(7 * 24 * 3600)))
+SESSION_COMMIT_RETRIES    = int(os.getenv("SESSION_COMMIT_RETRIES", "10"))
+# Purging expired keys is a write transaction (a global lock on SQLite), so at most this often per process
+SESSION_PURGE_INTERVAL    = int(os.getenv("SESSION_PURGE_INTERVAL", "60"))
+
+
+def sizeof(obj):
+    """Approximate deep size in bytes of session data (DataFrames measured with memory_usage)."""
+    if obj is None:
+        return 0
+    if hasattr(obj, "memory_usage") and hasattr(obj, "columns"):
+        return int(obj.memory_usage(deep=True).sum())
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(sizeof(k) + sizeof(v) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set)):
+        return sys.getsizeof(obj) + sum(sizeof(v) for v in obj)
+    return sys.getsizeof(obj)
+
+
+def _gzip_lines(turns):
+    return gzip.compress("".join(json.dumps(t, ensure_ascii=False) + "\n" for t in turns).encode("utf-8"))
+
+
+class SessionData:
+    """Per-session chat history, candidate table, scheduled-event index and UI flags.
+
+    The shared copy lives in the state backend under ``session:<sid>``: recent turns inline,
+    older turns as immutable gzipped JSON-lines chunks and the candidate table as gzipped JSON.
+    `flags` holds small per-session values every instance must agree on (chat mode, whether
+    scheduling already ran, the current agent thread id, ...).
+    This object is one instance's working copy; `SessionStore.commit` merges it back.
+    """
+
+    def __init__(self, sid, backend):
+        self.sid = sid
+        self.backend = backend
+        self.key = f"session:{sid}"
+        self.hot = []
+        self.chunks = []
+        self.spilled_turns = 0
+        self.scheduled_events = {}
+        self.flags = {}
+        self.table_key = None
+        self._table = None
+        self.table_dirty = False
+        self.version = 0
+        self.last_access = time.time()
+        self.lock = threading.RLock()
+        self._mark_synced()
+
+    def _mark_synced(self):
+        self.synced_turns = len(self.hot)
+        self.base_events = copy.deepcopy(self.scheduled_events)
+        self.base_flags = copy.deepcopy(self.flags)
+
+    def _adopt(self, state, version):
+        self.hot = list(state["hot"])
+        self.chunks = list(state["chunks"])
+        self.spilled_turns = state["spilled_turns"]
+        self.scheduled_events = state["scheduled_events"]
+        self.flags = state.get("flags", {})
+        if state["table"] != self.table_key:
+            self._table = None
+        self.table_key = state["table"]
+        self.version = version
+        self._mark_synced()
+
+    # -- history --
+    def append_turn(self, turn):
+        with self.lock:
+            self.hot.append(turn)
+
+    def iter_history(self):
+        """All turns, oldest first; spilled chunks are fetched one at a time rather than loaded at once."""
+        with self.lock:
+            hot = list(self.hot)
+            chunks = list(self.chunks)
+        for chunk in chunks:
+            raw, _ = self.backend.get(chunk)
+            if raw is None:
+                continue  # expired with SESSION_RETENTION
+            for line in gzip.decompress(raw).decode("utf-8").splitlines():
+                yield json.loads(line)
+        yield from hot
+
+    def history(self):
+        return list(self.iter_history())
+
+    # -- candidate table --
+    @property
+    def table(self):
+        with self.lock:
+            if self._table is None and self.table_key:
+                import pandas as pd
+                raw, _ = self.backend.get(self.table_key)
+                if raw is not None:
+                    # No type inference: phone numbers and dates must come back as the strings they were
+                    self._table = pd.read_json(io.StringIO(gzip.decompress(raw).decode("utf-8")), orient="split",
+                                               dtype=False, convert_dates=False)
+            return self._table
+
+    @table.setter
+    def table(self, df):
+        with self.lock:
+            self._table = df
+            self.table_dirty = True
+
+    def release_table(self):
+        """Drop the in-memory table once the backend has it; it is read back on next access."""
+        with self.lock:
+            if not self.table_dirty:
+                self._table = None
+
+    @property
+    def dirty(self):
+        return (len(self.hot) > self.synced_turns or self.table_dirty
+                or self.scheduled_events != self.base_events or self.flags != self.base_flags)
+
+    def nbytes(self):
+        with self.lock:
+            return sizeof(self.hot) + sizeof(self._table) + sizeof(self.scheduled_events)
+
+
+class SessionStore:
+    """Bounds session memory per process and keeps sessions in a backend shared by all instances.
+
+    Every rerun ends with `commit`, an optimistic merge into the shared copy, so any instance
+    behind the load balancer can pick the session up on the next request.
+    """
+
+    def __init__(self, backend=None, hot_turns=SESSION_HOT_TURNS, session_max_bytes=SESSION_MAX_BYTES,
+                 global_max_bytes=SESSION_GLOBAL_MAX_BYTES, idle_ttl=SESSION_IDLE_TTL, retention=SESSION_RETENTION):
+        self.backend = backend or get_backend()
+        self.hot_turns = hot_turns
+        self.session_max_bytes = session_max_bytes
+        self.global_max_bytes = global_max_bytes
+        self.idle_ttl = idle_ttl
+        self.retention = retention
+        self.sessions = {}
+        self.evicted = 0
+        self.conflicts = 0
+        self.last_purge = 0.0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def new_id():
+        return uuid.uuid4().hex
+
+    def session(self, sid):
+        """This instance's copy of `sid`, reloaded if another instance committed since, or rehydrated."""
+        state, version = self.backend.get_json(f"session:{sid}")
+        with self.lock:
+            data = self.sessions.get(sid)
+            if data is None:
+                data = SessionData(sid, self.backend)
+                self.sessions[sid] = data
+            data.last_access = time.time()
+        # Not under self.lock: commit() takes data.lock first and self.lock second
+        with data.lock:
+            if state is not None and version != data.version and not data.dirty:
+                data._adopt(state, version)
+        return data
+
+    def commit(self, data):
+        """Merge this run's changes into the shared copy; retried against newer versions on conflict.
+
+        New turns are appended after whatever other instances added, scheduled-event and flag
+        changes are applied key by key, and turns beyond the hot window are moved into a new
+        history chunk.
+        """
+        with data.lock:
+            if not data.dirty:
+                return
+            new_turns = data.hot[data.synced_turns:]
+            changed = {k: v for k, v in data.scheduled_events.items() if data.base_events.get(k) != v}
+            removed = [k for k in data.base_events if k not in data.scheduled_events]
+            flags = {k: v for k, v in data.flags.items() if data.base_flags.get(k) != v}
+            table_key = None
+            if data.table_dirty and data._table is not None:
+                table_key = f"{data.key}:table:{uuid.uuid4().hex}"
+                raw = gzip.compress(data._table.to_json(orient="split").encode("utf-8"))
+                self.backend.put(table_key, raw, ttl=self.retention)
+
+            for attempt in range(SESSION_COMMIT_RETRIES):
+                state, version = self.backend.get_json(data.key)
+                state = state or {"hot": [], "chunks": [], "spilled_turns": 0, "scheduled_events": {}, "table": None}
+                old_table = state["table"]
+                state["hot"] = state["hot"] + new_turns
+                state["scheduled_events"].update(changed)
+                for k in removed:
+                    state["scheduled_events"].pop(k, None)
+                state.setdefault("flags", {}).update(flags)
+                if data.table_dirty:
+                    state["table"] = table_key
+                keep = self.hot_turns
+                if sizeof(state["hot"]) + sizeof(data._table) > self.session_max_bytes:
+                    keep = 2
+                chunk = None
+                cold = state["hot"][:max(len(state["hot"]) - keep, 0)]
+                if cold:
+                    chunk = f"{data.key}:history:{uuid.uuid4().hex}"
+                    self.backend.put(chunk, _gzip_lines(cold), ttl=self.retention)
+                    state["hot"] = state["hot"][len(cold):]
+                    state["chunks"].append(chunk)
+                    state["spilled_turns"] += len(cold)
+                try:
+                    version = self.backend.put_json(data.key, state, version, ttl=self.retention)
+                except Conflict:
+                    if chunk:
+                        self.backend.delete(chunk)
+                    with self.lock:
+                        self.conflicts += 1
+                    time.sleep(min(0.01 * 2 ** attempt, 0.5))
+                    continue
+                if data.table_dirty:
+                    if old_table and old_table != table_key:
+                        self.backend.delete(old_table)
+                    # Our own table is already in memory; keep it rather than re-reading it
+                    data.table_key = table_key
+                    data.table_dirty = False
+                data._adopt(state, version)
+                return
+            raise Conflict(f"{data.key}: could not commit after {SESSION_COMMIT_RETRIES} attempts")
+
+    def claim(self, data, flag):
+        """Set `flag` in the shared copy only if no instance has set it yet; True if this call set it.
+
+        Used for one-shot side effects such as sending Teams invites, which must not run twice
+        when two instances serve the same session.
+        """
+        self.commit(data)
+        for attempt in range(SESSION_COMMIT_RETRIES):
+            state, version = self.backend.get_json(data.key)
+            state = state or {"hot": [], "chunks": [], "spilled_turns": 0, "scheduled_events": {}, "table": None}
+            with data.lock:
+                if state.get("flags", {}).get(flag):
+                    if version != data.version:
+                        data._adopt(state, version)
+                    return False
+                state.setdefault("flags", {})[flag] = True
+                try:
+                    version = self.backend.put_json(data.key, state, version, ttl=self.retention)
+                except Conflict:
+                    with self.lock:
+                        self.conflicts += 1
+                    time.sleep(min(0.01 * 2 ** attempt, 0.5))
+                    continue
+                data._adopt(state, version)
+                return True
+        raise Conflict(f"{data.key}: could not claim {flag} after {SESSION_COMMIT_RETRIES} attempts")
+
+    def enforce(self):
+        """Apply per-session and global memory caps and drop idle sessions; they stay in the backend."""
+        now = time.time()
+        with self.lock:
+            sessions = list(self.sessions.values())
+        for data in sessions:
+            if data.nbytes() > self.session_max_bytes:
+                data.release_table()
+        total = sum(d.nbytes() for d in sessions)
+        for data in sorted(sessions, key=lambda d: d.last_access):
+            idle = now - data.last_access
+            if idle > self.idle_ttl or (total > self.global_max_bytes and idle > 60):
+                total -= data.nbytes()
+                self._evict(data)
+        with self.lock:
+            purge = now - self.last_purge >= SESSION_PURGE_INTERVAL
+            if purge:
+                self.last_purge = now
+        if purge:
+            self.backend.purge_expired()
+
+    def _evict(self, data):
+        self.commit(data)
+        with self.lock:
+            if self.sessions.get(data.sid) is data:
+                del self.sessions[data.sid]
+                self.evicted += 1
+
+    def metrics(self):
+        """Per-session memory usage plus process totals, for the in-app panel or logging."""
+        now = time.time()
+        with self.lock:
+            sessions = list(self.sessions.values())
+            evicted, conflicts = self.evicted, self.conflicts
+        rows = [{
+            "session": d.sid[:8],
+            "bytes": d.nbytes(),
+            "hot_turns": len(d.hot),
+            "spilled_turns": d.spilled_turns,
+            "table_in_memory": d._table is not None,
+            "idle_s": int(now - d.last_access),
+            "version": d.version,
+        } for d in sessions]
+        return {"sessions": rows, "live": len(rows), "evicted": evicted, "commit_conflicts": conflicts,
+                "total_bytes": sum(r["bytes"] for r in rows), "global_max_bytes": self.global_max_bytes}
@@ -0,0 +1,322 @@
+import os
+import re
+import json
+import time
+import queue
+import socket
+import sqlite3
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+# ---- CONFIGURATION ----
+# STATE_BACKEND: "sqlite" (one file plus the archive folder) or "redis". SQLite relies on the
+# filesystem's locks, so across instances on a network mount (Azure's shared /home) use "redis".
+STATE_BACKEND    = os.getenv("STATE_BACKEND", "sqlite")
+# Absolute and under HOME (persistent on App Service), not wherever the process was started
+STATE_DB         = os.getenv("STATE_DB", os.path.join(os.path.expanduser("~"), "intellibot", "state.db"))
+STATE_REDIS_URL  = os.getenv("STATE_REDIS_URL", "redis://localhost:6379/0")
+STATE_POOL_SIZE  = int(os.getenv("STATE_POOL_SIZE", "8"))
+CHAT_ARCHIVE_DIR = os.getenv("CHAT_ARCHIVE_DIR", "all_chat_history_sr_")
+
+
+class Conflict(Exception):
+    """A versioned write lost the race: the key changed since it was read."""
+
+
+class StateBackend:
+    """Versioned key/value store shared by every app instance.
+
+    Every key carries a version that starts at 0 (missing) and goes up by one per write.
+    `put(..., version=v)` only succeeds if the key is still at `v`, otherwise it raises
+    Conflict, so instances can read-modify-write shared state without a central lock.
+    """
+
+    def get(self, key):
+        """(value bytes or None, version)."""
+        raise NotImplementedError
+
+    def put(self, key, value, version=None, ttl=None):
+        """Store `value`; with `version`, only if the key is still at it. Returns the new version."""
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def incr(self, key):
+        raise NotImplementedError
+
+    def save_archive(self, render):
+        """Store a chat archive under the next serial number; `render(serial)` returns its text."""
+        raise NotImplementedError
+
+    def purge_expired(self):
+        pass
+
+    def get_json(self, key, default=None):
+        value, version = self.get(key)
+        return (json.loads(value) if value is not None else default), version
+
+    def put_json(self, key, obj, version=None, ttl=None):
+        return self.put(key, json.dumps(obj, ensure_ascii=False).encode("utf-8"), version, ttl)
+
+    def update_json(self, key, fn, default=None, ttl=None, retries=20):
+        """Optimistic read-modify-write: `fn(current)` returns the new object; retried on Conflict."""
+        for attempt in range(retries):
+            current, version = self.get_json(key, default)
+            new = fn(current)
+            try:
+                self.put_json(key, new, version, ttl)
+                return new
+            except Conflict:
+                time.sleep(min(0.01 * 2 ** attempt, 0.5))
+        raise Conflict(f"{key}: gave up after {retries} attempts")
+
+
+def _as_bytes(value):
+    return value.encode("utf-8") if isinstance(value, str) else value
+
+
+class SQLiteBackend(StateBackend):
+    """Key/value state in one SQLite file; chat archives stay text files in CHAT_ARCHIVE_DIR.
+
+    Uses SQLite's default rollback journal: WAL needs shared memory that network filesystems
+    do not provide, and would corrupt the file when several hosts open it.
+    """
+
+    def __init__(self, path=STATE_DB, archive_dir=CHAT_ARCHIVE_DIR):
+        self.path = path
+        self.archive_dir = archive_dir
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=DELETE")  # also switches back files created in WAL mode
+            db.execute("CREATE TABLE IF NOT EXISTS kv "
+                       "(key TEXT PRIMARY KEY, value BLOB, version INTEGER, expires REAL)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    @contextmanager
+    def _transaction(self):
+        db = self._connect()
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            yield db
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        finally:
+            db.close()
+
+    @staticmethod
+    def _row(db, key):
+        """(value, version, stored version); an expired row reads as missing but keeps counting versions."""
+        row = db.execute("SELECT value, version, expires FROM kv WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None, 0, 0
+        value, version, expires = row
+        if expires is not None and expires <= time.time():
+            return None, 0, version
+        return value, version, version
+
+    def get(self, key):
+        db = self._connect()
+        try:
+            value, version, _ = self._row(db, key)
+        finally:
+            db.close()
+        return (bytes(value) if value is not None else None), version
+
+    def put(self, key, value, version=None, ttl=None):
+        with self._transaction() as db:
+            _, current, stored = self._row(db, key)
+            if version is not None and version != current:
+                raise Conflict(f"{key}: expected version {version}, found {current}")
+            new = stored + 1
+            db.execute("INSERT OR REPLACE INTO kv VALUES (?, ?, ?, ?)",
+                       (key, _as_bytes(value), new, time.time() + ttl if ttl else None))
+        return new
+
+    def delete(self, key):
+        with self._transaction() as db:
+            db.execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def incr(self, key):
+        with self._transaction() as db:
+            value, _, stored = self._row(db, key)
+            n = int(value or 0) + 1
+            db.execute("INSERT OR REPLACE INTO kv VALUES (?, ?, ?, NULL)", (key, str(n).encode(), stored + 1))
+        return n
+
+    def save_archive(self, render):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        with self._transaction() as db:
+            value, _, stored = self._row(db, "chat_archive:serial")
+            if value is None:
+                # First use: continue from archives written before the counter existed
+                files = [f for f in os.listdir(self.archive_dir) if f.endswith(".txt")]
+                nums = [int(re.findall(r'\d+', f)[-1]) for f in files if re.search(r'\d+', f)]
+                value = max(nums, default=0)
+            sr = int(value) + 1
+            db.execute("INSERT OR REPLACE INTO kv VALUES (?, ?, ?, NULL)",
+                       ("chat_archive:serial", str(sr).encode(), stored + 1))
+        path = os.path.join(self.archive_dir, f"all_chat_history_sr_{sr}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(render(sr))
+        return path
+
+    def purge_expired(self):
+        with self._transaction() as db:
+            db.execute("DELETE FROM kv WHERE expires IS NOT NULL AND expires <= ?", (time.time(),))
+
+
+class RespError(Exception):
+    """Error reply from a Redis-protocol server."""
+
+
+class RespConnection:
+    """One blocking connection speaking RESP2, enough for the commands RedisBackend uses."""
+
+    def __init__(self, host, port, password=None, db=0, timeout=10):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile("rb")
+        if password:
+            self.call("AUTH", password)
+        if db:
+            self.call("SELECT", db)
+
+    def call(self, *args):
+        out = [b"*%d\r\n" % len(args)]
+        for a in args:
+            a = _as_bytes(a if isinstance(a, (str, bytes)) else str(a))
+            out.append(b"$%d\r\n%s\r\n" % (len(a), a))
+        self.sock.sendall(b"".join(out))
+        return self._read()
+
+    def _read(self):
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("connection closed by server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RespError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            n = int(rest)
+            if n < 0:
+                return None
+            data = self.reader.read(n + 2)
+            return data[:-2]
+        if kind == b"*":
+            n = int(rest)
+            return None if n < 0 else [self._read() for _ in range(n)]
+        raise RespError(f"unexpected reply {line!r}")
+
+    def close(self):
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class RedisBackend(StateBackend):
+    """State in any Redis-protocol server (Redis, Azure Cache for Redis, resp_standin.py).
+
+    Values are stored as b"<version>:<payload>" in a plain string key, so a versioned put is
+    WATCH / GET / MULTI / SET / EXEC and the server aborts it if another client wrote first.
+    """
+
+    def __init__(self, url=STATE_REDIS_URL, pool_size=STATE_POOL_SIZE):
+        u = urlparse(url)
+        self.host = u.hostname or "localhost"
+        self.port = u.port or 6379
+        self.password = u.password
+        self.db = int((u.path or "/0").lstrip("/") or 0)
+        self.pool = queue.LifoQueue(maxsize=pool_size)
+
+    @contextmanager
+    def _conn(self):
+        try:
+            conn = self.pool.get_nowait()
+        except queue.Empty:
+            conn = RespConnection(self.host, self.port, self.password, self.db)
+        broken = False
+        try:
+            yield conn
+        except (OSError, ConnectionError, RespError):
+            # An error reply can leave the connection mid-MULTI with commands queued; never reuse it
+            broken = True
+            conn.close()
+            raise
+        finally:
+            if not broken:
+                try:
+                    self.pool.put_nowait(conn)
+                except queue.Full:
+                    conn.close()
+
+    @staticmethod
+    def _split(raw):
+        if raw is None:
+            return None, 0
+        version, _, payload = raw.partition(b":")
+        return payload, int(version)
+
+    def get(self, key):
+        with self._conn() as c:
+            return self._split(c.call("GET", key))
+
+    def put(self, key, value, version=None, ttl=None):
+        expiry = ("EX", int(max(ttl, 1))) if ttl else ()
+        with self._conn() as c:
+            c.call("WATCH", key)
+            try:
+                _, current = self._split(c.call("GET", key))
+                if version is not None and version != current:
+                    raise Conflict(f"{key}: expected version {version}, found {current}")
+                new = current + 1
+                c.call("MULTI")
+                c.call("SET", key, b"%d:" % new + _as_bytes(value), *expiry)
+                if c.call("EXEC") is None:
+                    raise Conflict(f"{key}: changed during write")
+            finally:
+                c.call("UNWATCH")
+        return new
+
+    def delete(self, key):
+        with self._conn() as c:
+            c.call("DEL", key)
+
+    def incr(self, key):
+        with self._conn() as c:
+            return c.call("INCR", key)
+
+    def save_archive(self, render):
+        sr = self.incr("chat_archive:serial")
+        key = f"chat_archive:{sr}"
+        self.put(key, render(sr))
+        return f"redis://{self.host}:{self.port}/{self.db}#{key}"
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Process-wide backend selected by STATE_BACKEND."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if STATE_BACKEND == "redis":
+                _backend = RedisBackend()
+            elif STATE_BACKEND == "sqlite":
+                _backend = SQLiteBackend()
+            else:
+                raise ValueError(f"Unknown STATE_BACKEND {STATE_BACKEND!r} (use 'sqlite' or 'redis')")
+        return _backend
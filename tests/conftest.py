@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The modules live at the repo root; keep test runs from writing trace files
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("TRACE_EXPORTER", "none")
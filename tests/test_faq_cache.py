@@ -0,0 +1,81 @@
+from faq_cache import FAQCache, cacheable_turn, is_question
+
+
+def agent(answer):
+    calls = []
+
+    def compute():
+        calls.append(answer)
+        return answer
+    return compute, calls
+
+
+def test_generic_question_is_served_from_cache():
+    cache = FAQCache()
+    compute, calls = agent("Employees get 20 days of paid leave a year.")
+    assert cache.answer("What is the leave policy?", compute) == (calls[0], False)
+    assert cache.answer("what is the leave policy", compute)[1] is True
+    assert len(calls) == 1
+
+
+def test_bare_name_is_never_cached():
+    cache = FAQCache()
+    compute, calls = agent("Thanks. What is Rahul's email?")
+    cache.answer("Rahul Sharma", compute)
+    other, other_calls = agent("Thanks. What is Rahul's email address?")
+    assert cache.answer("rahul sharma", other) == (other_calls[0], False)
+    assert cache.report()["entries"] == 0
+
+
+def test_short_confirmations_are_never_cached():
+    cache = FAQCache()
+    for reply in ("Yes!", "ok go ahead", "no"):
+        compute, _ = agent("Great, scheduling it now.")
+        assert cache.answer(reply, compute)[1] is False
+    assert cache.report()["entries"] == 0
+    assert not is_question("Yes!")
+    assert not is_question("ok go ahead")
+
+
+def test_answers_to_agent_questions_are_not_cached():
+    cache = FAQCache()
+    prompt = "Got it. What are the candidate's key skills?"
+    compute, _ = agent("Noted. What is the notice period?")
+    cache.answer("What about Python, Django and AWS?", compute, previous_reply=prompt)
+    assert cache.report()["entries"] == 0
+    assert not cacheable_turn("What is the notice period policy?", previous_reply=prompt)
+    assert cacheable_turn("What is the notice period policy?", previous_reply="The policy is 30 days.")
+
+
+def test_answers_naming_a_person_are_not_cached():
+    cache = FAQCache()
+    compute, _ = agent("Please share it with Priya Nair from the hiring team.")
+    cache.answer("Who handles offer letters?", compute)
+    assert cache.report()["entries"] == 0
+
+
+def test_questions_about_the_conversation_are_not_cached():
+    cache = FAQCache()
+    for question, reply in [
+        ("What is the candidate's notice period?",
+         "The candidate has a notice period of 30 days and 5 years of experience in Django."),
+        ("What are the key skills of the candidate?", "The candidate knows Python, Django and AWS."),
+        ("When is Priya free?", "Any weekday afternoon works."),
+        ("What did she say about relocation?", "Relocation is fine."),
+        ("Can you remind me of his current role?", "Senior backend engineer."),
+    ]:
+        compute, calls = agent(reply)
+        assert cache.answer(question, compute)[1] is False
+        assert cache.answer(question, compute)[1] is False
+        assert len(calls) == 2
+    assert cache.report()["entries"] == 0
+
+
+def test_answers_about_a_profile_are_not_stored():
+    cache = FAQCache()
+    for answer in ("The notice period is 30 days and 5 years of experience in Django.",
+                   "Key skills are Python, Django and AWS.",
+                   "The interviewer joins from the Pune office."):
+        compute, _ = agent(answer)
+        cache.answer("What should I ask for next?", compute)
+    assert cache.report()["entries"] == 0
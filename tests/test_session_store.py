@@ -0,0 +1,65 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from session_store import SessionStore
+from state_backend import SQLiteBackend
+
+
+@pytest.fixture
+def backend(tmp_path):
+    return SQLiteBackend(str(tmp_path / "state.db"), str(tmp_path / "archive"))
+
+
+def test_two_instances_merge_turns_events_and_flags(backend):
+    a, b = SessionStore(backend), SessionStore(backend)
+    da, db = a.session("s"), b.session("s")
+    da.append_turn({"user": "a1", "bot": ""})
+    da.scheduled_events["e1"] = {"name": "Rahul"}
+    db.append_turn({"user": "b1", "bot": ""})
+    db.scheduled_events["e2"] = {"name": "Priya"}
+    db.flags["chat_mode"] = False
+    a.commit(da)
+    b.commit(db)
+
+    fresh = SessionStore(backend).session("s")
+    assert [t["user"] for t in fresh.history()] == ["a1", "b1"]
+    assert set(fresh.scheduled_events) == {"e1", "e2"}
+    assert fresh.flags == {"chat_mode": False}
+    # The first instance picks up the second one's commit on its next run
+    assert a.session("s").flags == {"chat_mode": False}
+
+
+def test_removed_events_stay_removed(backend):
+    a = SessionStore(backend)
+    data = a.session("s")
+    data.scheduled_events.update({"e1": {}, "e2": {}})
+    a.commit(data)
+    del data.scheduled_events["e1"]
+    a.commit(data)
+    assert set(SessionStore(backend).session("s").scheduled_events) == {"e2"}
+
+
+def test_concurrent_commits_keep_every_turn_and_spill_old_ones(backend):
+    stores = [SessionStore(backend, hot_turns=5) for _ in range(4)]
+
+    def chat(i):
+        store = stores[i % len(stores)]
+        data = store.session("s")
+        data.append_turn({"user": f"u{i}", "bot": ""})
+        store.commit(data)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(chat, range(30)))
+
+    data = SessionStore(backend).session("s")
+    assert sorted(t["user"] for t in data.history()) == sorted(f"u{i}" for i in range(30))
+    assert len(data.hot) <= 5 and data.spilled_turns == 30 - len(data.hot)
+
+
+def test_claim_succeeds_for_exactly_one_instance(backend):
+    stores = [SessionStore(backend) for _ in range(8)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        won = list(pool.map(lambda s: s.claim(s.session("s"), "scheduling_done"), stores))
+    assert won.count(True) == 1
+    assert stores[0].session("s").flags["scheduling_done"] is True
+    assert not stores[0].claim(stores[0].session("s"), "scheduling_done")
@@ -0,0 +1,60 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import resp_standin
+from state_backend import Conflict, RedisBackend, RespError, SQLiteBackend
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        yield SQLiteBackend(str(tmp_path / "state.db"), str(tmp_path / "archive"))
+        return
+    server = resp_standin.serve()
+    host, port = server.server_address
+    yield RedisBackend(f"redis://{host}:{port}/0")
+    server.shutdown()
+
+
+def test_versioned_put_rejects_stale_writes(backend):
+    assert backend.get("k") == (None, 0)
+    v1 = backend.put("k", b"a")
+    assert backend.get("k") == (b"a", v1)
+    v2 = backend.put("k", b"b", version=v1)
+    with pytest.raises(Conflict):
+        backend.put("k", b"stale", version=v1)
+    assert backend.get("k") == (b"b", v2)
+    backend.delete("k")
+    assert backend.get("k")[0] is None
+
+
+def test_ttl_expires_keys(backend):
+    backend.put("k", b"x", ttl=1)
+    time.sleep(1.2)
+    assert backend.get("k")[0] is None
+
+
+def test_concurrent_updates_are_not_lost(backend):
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: backend.update_json("counter", lambda n: n + 1, default=0), range(40)))
+    assert backend.get_json("counter")[0] == 40
+    assert backend.incr("n") == 1 and backend.incr("n") == 2
+
+
+def test_archives_get_increasing_serials(backend):
+    first = backend.save_archive(lambda sr: f"chat {sr}")
+    second = backend.save_archive(lambda sr: f"chat {sr}")
+    assert first != second
+
+
+def test_redis_connection_with_error_reply_is_not_reused(backend):
+    if not isinstance(backend, RedisBackend):
+        pytest.skip("Redis connection pool")
+    with pytest.raises(RespError):
+        with backend._conn() as c:
+            c.call("BOGUS")
+    assert backend.pool.qsize() == 0
+    backend.put("k", b"v")
+    assert backend.get("k") == (b"v", 1) and backend.pool.qsize() == 1
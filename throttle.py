@@ -0,0 +1,229 @@
+import os
+import re
+import time
+import sqlite3
+import threading
+
+import requests
+
+# ---- CONFIGURATION ----
+# RATE_LIMITS: "endpoint=requests/seconds[:burst]" pairs, e.g. "groq=30/60,graph=10/1:20,agents=180/60"
+RATE_LIMITS      = os.getenv("RATE_LIMITS", "")
+RATE_LIMIT_DB    = os.getenv("RATE_LIMIT_DB")          # SQLite file shared by all worker processes
+RATE_MAX_RETRIES = int(os.getenv("RATE_MAX_RETRIES", "3"))
+HTTP_POOL_SIZE   = int(os.getenv("HTTP_POOL_SIZE", "16"))
+# Pause until x-ratelimit-reset-tokens once fewer LLM tokens than this are left in the window
+RATE_TOKEN_HEADROOM = int(os.getenv("RATE_TOKEN_HEADROOM", "2000"))
+
+DEFAULT_LIMITS = {
+    "groq":   (30, 60.0, 5),
+    "graph":  (10, 1.0, 20),
+    "aad":    (5, 1.0, 5),
+    "agents": (180, 60.0, 30),
+}
+
+_DURATION_RE = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+
+
+def parse_limits(spec):
+    limits = dict(DEFAULT_LIMITS)
+    for item in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, rate = item.partition("=")
+        rate, _, burst = rate.partition(":")
+        count, _, per = rate.partition("/")
+        count, per = float(count), float(per or 1)
+        limits[name.strip()] = (count, per, float(burst) if burst else max(1.0, count))
+    return limits
+
+
+def parse_reset(value):
+    """Seconds from a Retry-After / x-ratelimit-reset-* value ("7", "1.5s", "2m59.56s", "120ms")."""
+    if value is None:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    units = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    parts = _DURATION_RE.findall(value)
+    return sum(float(n) * units[u] for n, u in parts) if parts else None
+
+
+class TokenBucket:
+    """In-process token bucket; `pause_until` lets server hints override the local rate."""
+
+    def __init__(self, rate, per, burst):
+        self.rate = rate / per
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.pause_until = 0.0
+        self.lock = threading.Lock()
+
+    def _wait_time(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if now < self.pause_until:
+            return self.pause_until - now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                wait = self._wait_time(time.monotonic())
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        with self.lock:
+            self.pause_until = max(self.pause_until, time.monotonic() + seconds)
+
+    def observe(self, remaining, reset_seconds):
+        """Align the bucket with the server's view of the quota window; headers can only lower it."""
+        with self.lock:
+            if remaining is not None:
+                self.tokens = min(self.tokens, remaining)
+            if remaining == 0 and reset_seconds:
+                self.pause_until = max(self.pause_until, time.monotonic() + reset_seconds)
+
+
+class SQLiteBucket(TokenBucket):
+    """Token bucket whose state lives in SQLite so several processes share one quota."""
+
+    def __init__(self, name, rate, per, burst, path):
+        super().__init__(rate, per, burst)
+        self.name = name
+        self.path = path
+        with self._connect() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS buckets "
+                       "(name TEXT PRIMARY KEY, tokens REAL, updated REAL, pause_until REAL)")
+            db.execute("INSERT OR IGNORE INTO buckets VALUES (?, ?, ?, 0)", (name, burst, time.time()))
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def _locked(self, fn):
+        db = self._connect()
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            self.tokens, self.updated, self.pause_until = db.execute(
+                "SELECT tokens, updated, pause_until FROM buckets WHERE name = ?", (self.name,)).fetchone()
+            result = fn()
+            db.execute("UPDATE buckets SET tokens = ?, updated = ?, pause_until = ? WHERE name = ?",
+                       (self.tokens, self.updated, self.pause_until, self.name))
+            db.execute("COMMIT")
+            return result
+        finally:
+            db.close()
+
+    # Wall-clock time is used here because monotonic clocks are not comparable across processes
+    def acquire(self):
+        while True:
+            wait = self._locked(lambda: self._wait_time(time.time()))
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        def apply():
+            self.pause_until = max(self.pause_until, time.time() + seconds)
+        self._locked(apply)
+
+    def observe(self, remaining, reset_seconds):
+        def apply():
+            if remaining is not None:
+                self.tokens = min(self.tokens, remaining)
+            if remaining == 0 and reset_seconds:
+                self.pause_until = max(self.pause_until, time.time() + reset_seconds)
+        self._locked(apply)
+
+
+_limits  = parse_limits(RATE_LIMITS)
+_buckets = {}
+_session = None
+_registry_lock = threading.Lock()
+
+
+def session():
+    """Process-wide HTTP session so Groq/Graph calls reuse pooled keep-alive connections."""
+    global _session
+    with _registry_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=8, pool_maxsize=HTTP_POOL_SIZE)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+def bucket(endpoint):
+    with _registry_lock:
+        if endpoint not in _buckets:
+            rate, per, burst = _limits.get(endpoint, (10, 1.0, 10))
+            if RATE_LIMIT_DB:
+                _buckets[endpoint] = SQLiteBucket(endpoint, rate, per, burst, RATE_LIMIT_DB)
+            else:
+                _buckets[endpoint] = TokenBucket(rate, per, burst)
+        return _buckets[endpoint]
+
+
+def acquire(endpoint):
+    """Block until `endpoint` has capacity. Use directly for SDK calls that bypass `request`."""
+    bucket(endpoint).acquire()
+
+
+# Methods that are safe to resend after a 503; anything else could e.g. create a meeting twice
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+
+def _header_number(headers, *names):
+    for name in names:
+        value = headers.get(name)
+        if value is not None:
+            try:
+                return float(value)
+            except ValueError:
+                return None
+    return None
+
+
+def _observe_headers(b, headers):
+    remaining = _header_number(headers, "x-ratelimit-remaining-requests", "x-ratelimit-remaining")
+    reset = headers.get("x-ratelimit-reset-requests") or headers.get("x-ratelimit-reset")
+    if remaining is not None or reset is not None:
+        b.observe(remaining, parse_reset(reset))
+    # Groq usually throttles on tokens per minute long before its daily request count runs out
+    tokens_left = _header_number(headers, "x-ratelimit-remaining-tokens")
+    if tokens_left is not None and tokens_left < RATE_TOKEN_HEADROOM:
+        b.pause(parse_reset(headers.get("x-ratelimit-reset-tokens")) or 1.0)
+
+
+def request(endpoint, method, url, **kwargs):
+    """`requests.request` that waits for the endpoint's bucket and honours Retry-After.
+
+    429 is always retried (the request was rejected, not run); 503 only for idempotent methods.
+    """
+    b = bucket(endpoint)
+    retry_on = (429, 503) if method.upper() in IDEMPOTENT_METHODS else (429,)
+    for attempt in range(RATE_MAX_RETRIES + 1):
+        b.acquire()
+        r = session().request(method, url, **kwargs)
+        _observe_headers(b, r.headers)
+        if r.status_code not in retry_on or attempt == RATE_MAX_RETRIES:
+            return r
+        retry_after = parse_reset(r.headers.get("Retry-After")) or 2 ** attempt
+        b.pause(retry_after)
+    return r
+
+
+def post(endpoint, url, **kwargs):
+    return request(endpoint, "POST", url, **kwargs)
+
+
+def delete(endpoint, url, **kwargs):
+    return request(endpoint, "DELETE", url, **kwargs)
@@ -0,0 +1,186 @@
+import os
+import sys
+import json
+import atexit
+import queue
+import time
+import uuid
+import threading
+import contextlib
+import logging
+import logging.handlers
+from collections import deque
+
+# ---- CONFIGURATION ----
+# TRACE_EXPORTER: "none" (in-app panels only), "file" (rotated JSON lines), "console" (stderr)
+# or "otel" (OpenTelemetry SDK, if installed)
+TRACE_EXPORTER       = os.getenv("TRACE_EXPORTER", "none").strip().lower()
+TRACE_FILE           = os.getenv("TRACE_FILE", os.path.join(os.path.expanduser("~"), "intellibot", "traces", "spans.jsonl"))
+TRACE_FILE_MAX_BYTES = int(os.getenv("TRACE_FILE_MAX_BYTES", str(10 * 1024 * 1024)))
+TRACE_FILE_BACKUPS   = int(os.getenv("TRACE_FILE_BACKUPS", "3"))
+TRACE_BUFFER         = int(os.getenv("TRACE_BUFFER", "500"))
+
+_local      = threading.local()
+_recent     = deque(maxlen=TRACE_BUFFER)
+_file_lock  = threading.Lock()
+_file_log   = None
+
+_otel_tracer = None
+if TRACE_EXPORTER == "otel":
+    try:
+        from opentelemetry import trace as _otel_trace
+        _otel_tracer = _otel_trace.get_tracer("intellibot")
+    except ImportError:
+        TRACE_EXPORTER = "none"
+
+
+class Span:
+    """A single timed operation. Serialises to the OTLP/JSON span shape."""
+
+    def __init__(self, name, trace_id, parent_id=None, attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.status = "OK"
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self._perf_start = time.perf_counter()
+        self.duration_ms = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def record_tokens(self, prompt_tokens=None, completion_tokens=None, total_tokens=None):
+        if prompt_tokens is not None:
+            self.attributes["llm.usage.prompt_tokens"] = prompt_tokens
+        if completion_tokens is not None:
+            self.attributes["llm.usage.completion_tokens"] = completion_tokens
+        if total_tokens is None and prompt_tokens is not None and completion_tokens is not None:
+            total_tokens = prompt_tokens + completion_tokens
+        if total_tokens is not None:
+            self.attributes["llm.usage.total_tokens"] = total_tokens
+
+    def end(self):
+        self.end_ns = time.time_ns()
+        self.duration_ms = round((time.perf_counter() - self._perf_start) * 1000, 1)
+
+    def to_dict(self):
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "durationMs": self.duration_ms,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+def current_span():
+    stack = _stack()
+    return stack[-1] if stack else None
+
+
+def _file_logger():
+    """Size-capped rotating writer, fed through a queue so requests never wait on disk."""
+    global _file_log
+    with _file_lock:
+        if _file_log is None:
+            os.makedirs(os.path.dirname(os.path.abspath(TRACE_FILE)), exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(TRACE_FILE, maxBytes=TRACE_FILE_MAX_BYTES,
+                                                           backupCount=TRACE_FILE_BACKUPS, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            records = queue.SimpleQueue()
+            listener = logging.handlers.QueueListener(records, handler)
+            listener.start()
+            atexit.register(listener.stop)  # flush what is still queued
+            log = logging.getLogger("intellibot.traces")
+            log.setLevel(logging.INFO)
+            log.propagate = False
+            log.addHandler(logging.handlers.QueueHandler(records))
+            _file_log = log
+        return _file_log
+
+
+def _export(s):
+    _recent.append(s)
+    if TRACE_EXPORTER in ("none", "otel"):
+        return
+    line = json.dumps(s.to_dict(), default=str)
+    if TRACE_EXPORTER == "console":
+        print(f"[trace] {line}", file=sys.stderr)
+        return
+    _file_logger().info(line)
+
+
+@contextlib.contextmanager
+def span(name, parent=None, **attributes):
+    """Time the enclosed block as a child of the current span (or as a new trace root).
+
+    Pass `parent` explicitly when the block runs on a worker thread.
+    """
+    parent = parent or current_span()
+    trace_id = parent.trace_id if parent else uuid.uuid4().hex
+    s = Span(name, trace_id, parent.span_id if parent else None, attributes)
+    otel_cm = _otel_tracer.start_as_current_span(name) if _otel_tracer else contextlib.nullcontext()
+    stack = _stack()
+    stack.append(s)
+    with otel_cm as otel_span:
+        try:
+            yield s
+        except Exception as e:
+            s.status = "ERROR"
+            s.set_attribute("exception.type", type(e).__name__)
+            s.set_attribute("exception.message", str(e)[:500])
+            raise
+        finally:
+            stack.pop()
+            s.end()
+            if otel_span is not None:
+                for k, v in s.attributes.items():
+                    if isinstance(v, (str, bool, int, float)):
+                        otel_span.set_attribute(k, v)
+            _export(s)
+
+
+def record_usage(usage, target=None):
+    """Attach LLM token usage (dict or object with *_tokens fields) to a span."""
+    s = target or current_span()
+    if s is None or usage is None:
+        return
+    get = usage.get if isinstance(usage, dict) else (lambda k: getattr(usage, k, None))
+    s.record_tokens(get("prompt_tokens"), get("completion_tokens"), get("total_tokens"))
+
+
+def spans_for(trace_id):
+    """Finished spans of one trace, in start order, for the in-app latency panel."""
+    if not trace_id:
+        return []
+    return sorted((s for s in list(_recent) if s.trace_id == trace_id), key=lambda s: s.start_ns)
+
+
+def latency_rows(trace_id):
+    spans = spans_for(trace_id)
+    parents = {s.span_id: s.parent_id for s in spans}
+    rows = []
+    for s in spans:
+        depth, p = 0, s.parent_id
+        while p in parents:
+            depth, p = depth + 1, parents[p]
+        rows.append({
+            "stage": "  " * depth + s.name,
+            "ms": s.duration_ms,
+            "tokens": s.attributes.get("llm.usage.total_tokens", ""),
+            "status": s.status,
+        })
+    return rows